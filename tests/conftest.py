@@ -0,0 +1,19 @@
+"""
+Shared setup for the Community Layout Switcher tests.
+
+The application modules live in usr/share/comm-layout-switcher and import
+each other as top-level modules, so that directory goes on sys.path. HOME
+and XDG_CACHE_HOME point at a scratch directory before anything is
+imported, since constants.py derives its config and cache paths from them.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_SCRATCH = tempfile.mkdtemp(prefix='comm-layout-switcher-tests-')
+os.environ['HOME'] = _SCRATCH
+os.environ['XDG_CACHE_HOME'] = os.path.join(_SCRATCH, '.cache')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'usr' / 'share' / 'comm-layout-switcher'))
@@ -0,0 +1,37 @@
+import threading
+import concurrent.futures
+
+from apply_scheduler import ApplyScheduler
+
+
+def test_requests_submitted_while_busy_collapse_to_the_latest():
+    started, release = threading.Event(), threading.Event()
+    runs = []
+    
+    def job(value, token):
+        runs.append((value, token.cancelled()))
+        if value == 'first':
+            started.set()
+            release.wait(10)
+            runs.append(('first done', token.cancelled()))
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        scheduler = ApplyScheduler(executor)
+        scheduler.submit('layout', job, 'first')
+        started.wait(10)
+        scheduler.submit('layout', job, 'second')
+        scheduler.submit('layout', job, 'third')
+        release.set()
+    
+    assert runs == [('first', False), ('first done', True), ('third', False)]
+
+
+def test_lanes_run_independently():
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        scheduler = ApplyScheduler(executor)
+        scheduler.submit('gtk', lambda token: results.append('gtk'))
+        scheduler.submit('icons', lambda token: results.append('icons'))
+    
+    assert sorted(results) == ['gtk', 'icons']
+    assert scheduler.generation('gtk') == 1 and scheduler.generation('layout') == 0
@@ -0,0 +1,203 @@
+import json
+import threading
+
+import pytest
+
+import backup_store
+from backup_store import BackupStore
+
+SECTIONS = {
+    'org/gnome/shell': {'favorite-apps': "['a.desktop']", 'enabled-extensions': "['dash-to-dock']"},
+    'org/gnome/shell/extensions/dash-to-dock': {'dock-position': "'BOTTOM'"},
+}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Point the store at an empty directory and forget any cached index"""
+    monkeypatch.setattr(BackupStore, 'OBJECTS_DIR', tmp_path / 'objects')
+    monkeypatch.setattr(BackupStore, 'MANIFESTS_DIR', tmp_path / 'manifests')
+    monkeypatch.setattr(BackupStore, 'INDEX_FILE', tmp_path / 'index.json')
+    monkeypatch.setattr(BackupStore, 'LOCK_FILE', tmp_path / 'store.lock')
+    monkeypatch.setattr(BackupStore, '_entries', None)
+    monkeypatch.setattr(BackupStore, '_entries_mtime', None)
+    return tmp_path
+
+
+def blob_files(root):
+    return sorted(path for path in (root / 'objects').glob('*/*'))
+
+
+def test_save_and_load_round_trip(store):
+    manifest_file = BackupStore.save(SECTIONS.items(), scope=['/org/gnome/shell/', '/org/gnome/shell/'])
+    
+    assert manifest_file.parent == store / 'manifests'
+    assert BackupStore.load(manifest_file) == (SECTIONS, ['/org/gnome/shell/'])
+    assert BackupStore.latest() == manifest_file
+    assert BackupStore.entries()[-1][0] == manifest_file.name
+
+
+def test_save_skips_empty_sections(store):
+    manifest_file = BackupStore.save([('a', {}), ('b', {'x': '1'})])
+    
+    assert BackupStore.load(manifest_file) == ({'b': {'x': '1'}}, None)
+
+
+def test_unchanged_save_returns_latest_backup(store):
+    first = BackupStore.save(SECTIONS.items())
+    
+    assert BackupStore.save(SECTIONS.items()) == first
+    assert len(BackupStore.entries()) == 1
+    
+    # A different scope is a different backup even with the same contents
+    assert BackupStore.save(SECTIONS.items(), scope=['/org/']) != first
+
+
+def test_backups_share_blobs_of_unchanged_sections(store):
+    large = {'favorite-apps': repr([f'app{i}.desktop' for i in range(100)])}
+    BackupStore.save([('org/gnome/shell', large), ('org/small', {'x': '1'})])
+    BackupStore.save([('org/gnome/shell', large), ('org/small', {'x': '2'})])
+    
+    # One shared blob for the large section, and a pack of small sections per backup
+    assert len(BackupStore.entries()) == 2
+    assert len(blob_files(store)) == 3
+
+
+def test_small_sections_are_packed_into_one_compressed_blob(store):
+    sections = {f'org/app{i}': {'enabled': 'true', 'size': str(i)} for i in range(50)}
+    manifest_file = BackupStore.save(sections.items())
+    
+    assert [path.suffix for path in blob_files(store)] == ['.xz']
+    assert BackupStore.read_manifest(manifest_file)['sections'] == {}
+    assert BackupStore.load(manifest_file) == (sections, None)
+
+
+def test_manifests_without_packs_stay_readable(store):
+    digest = BackupStore.write_blob(BackupStore.section_blob({'x': '1'}))
+    manifest_file = store / 'manifests' / 'backup_20240301_100000.json'
+    manifest_file.parent.mkdir()
+    manifest_file.write_text(json.dumps({
+        'version': 1, 'created': '2024-03-01T10:00:00', 'scope': None, 'sections': {'org/a': digest}
+    }))
+    
+    assert BackupStore.load(manifest_file) == ({'org/a': {'x': '1'}}, None)
+
+
+def test_index_is_rebuilt_from_manifests(store):
+    manifest_file = BackupStore.save(SECTIONS.items())
+    (store / 'index.json').unlink()
+    BackupStore._entries = None
+    
+    assert [entry[0] for entry in BackupStore.entries()] == [manifest_file.name]
+
+
+def test_large_blobs_are_compressed_and_small_ones_are_not(store):
+    large = BackupStore.write_blob(b'x' * 4096)
+    small = BackupStore.write_blob(b'key=1\n')
+    
+    assert BackupStore.find_blob(large) == (BackupStore.blob_path(large, 'xz'), 'xz')
+    assert BackupStore.find_blob(small) == (BackupStore.blob_path(small), None)
+    assert BackupStore.blob_path(large, 'xz').stat().st_size < 4096
+    assert BackupStore.read_blob(large) == b'x' * 4096
+    assert BackupStore.read_blob(small) == b'key=1\n'
+
+
+def test_blobs_in_another_format_stay_readable(store, monkeypatch):
+    monkeypatch.setattr(backup_store, 'BACKUP_COMPRESSION', 'gzip')
+    digest = BackupStore.write_blob(b'y' * 4096)
+    monkeypatch.setattr(backup_store, 'BACKUP_COMPRESSION', 'xz')
+    
+    assert BackupStore.find_blob(digest)[1] == 'gzip'
+    assert BackupStore.read_blob(digest) == b'y' * 4096
+
+
+def test_corrupt_blob_is_rejected(store):
+    digest = BackupStore.write_blob(b'key=1\n')
+    BackupStore.blob_path(digest).write_bytes(b'key=2\n')
+    
+    with pytest.raises(ValueError):
+        BackupStore.read_blob(digest)
+
+
+def test_missing_blob_is_reported(store):
+    with pytest.raises(FileNotFoundError):
+        BackupStore.read_blob('0' * 64)
+
+
+def save_backups(count):
+    return [BackupStore.save([('org/test', {'value': str(i)})]).name for i in range(count)]
+
+
+def test_retained_keeps_latest_backups_and_one_per_day_with_backups():
+    entries = [
+        ('a', '2024-03-01T10:00:00', False),
+        ('b', '2024-03-01T12:00:00', False),
+        ('c', '2024-03-03T09:00:00', False),
+        ('d', '2024-03-10T08:00:00', False),
+        ('e', '2024-03-10T18:00:00', True),
+    ]
+    policy = {'keep_last': 1, 'keep_daily': 2, 'keep_weekly': 0}
+    
+    assert [entry[0] for entry in BackupStore.retained(entries, policy)] == ['c', 'e']
+    
+    policy = {'keep_last': 2, 'keep_daily': 0, 'keep_weekly': 2}
+    assert [entry[0] for entry in BackupStore.retained(entries, policy)] == ['c', 'd', 'e']
+
+
+def test_retained_always_keeps_the_latest_backup():
+    entries = [('a', '2024-03-01T10:00:00', False), ('b', '2024-03-02T10:00:00', False)]
+    policy = {'keep_last': 0, 'keep_daily': 0, 'keep_weekly': 0}
+    
+    assert BackupStore.retained(entries, policy) == entries[1:]
+
+
+def test_prune_evicts_backups_outside_the_policy(store, monkeypatch):
+    monkeypatch.setattr(backup_store, 'BLOB_GRACE_SECONDS', -60)
+    names = save_backups(4)
+    policy = {'keep_last': 2, 'keep_daily': 0, 'keep_weekly': 0}
+    
+    assert BackupStore.prune(policy, dry_run=True) == names[:2]
+    assert len(BackupStore.entries()) == 4
+    
+    assert BackupStore.prune(policy) == names[:2]
+    assert [entry[0] for entry in BackupStore.entries()] == names[2:]
+    assert sorted(path.name for path in (store / 'manifests').iterdir()) == names[2:]
+    assert len(blob_files(store)) == 2
+    assert BackupStore.load(store / 'manifests' / names[2])[0] == {'org/test': {'value': '2'}}
+    
+    assert BackupStore.prune(policy) == []
+
+
+def test_prune_keeps_recent_unreferenced_blobs(store):
+    save_backups(3)
+    BackupStore.prune({'keep_last': 1, 'keep_daily': 0, 'keep_weekly': 0})
+    
+    assert len(BackupStore.entries()) == 1
+    assert len(blob_files(store)) == 3
+
+
+def test_prune_drops_oldest_backups_over_the_size_budget(store):
+    names = save_backups(3)
+    
+    assert BackupStore.prune({'max_bytes': 1}) == names[:2]
+    assert [entry[0] for entry in BackupStore.entries()] == names[2:]
+
+
+def test_listing_backups_does_not_wait_for_a_running_prune(store):
+    names = save_backups(2)
+    BackupStore._entries = None
+    holding, release = threading.Event(), threading.Event()
+    
+    def hold_lock():
+        with BackupStore._locked():
+            holding.set()
+            release.wait(10)
+    
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    try:
+        holding.wait(10)
+        assert [entry[0] for entry in BackupStore.entries()] == names
+    finally:
+        release.set()
+        holder.join()
@@ -0,0 +1,71 @@
+from dconf_utils import DconfKeyfile
+
+DUMP = """[/]
+root-key=1
+
+[org/gnome/shell]
+favorite-apps=['org.gnome.Nautilus.desktop', 'firefox.desktop']
+enabled-extensions=@as []
+
+[org/gnome/shell/extensions/dash-to-dock]
+dock-position='BOTTOM'
+"""
+
+
+def test_parse_reads_sections_and_values():
+    sections = DconfKeyfile.parse(DUMP)
+    
+    assert list(sections) == ['/', 'org/gnome/shell', 'org/gnome/shell/extensions/dash-to-dock']
+    assert sections['org/gnome/shell']['favorite-apps'] == "['org.gnome.Nautilus.desktop', 'firefox.desktop']"
+    assert sections['org/gnome/shell/extensions/dash-to-dock'] == {'dock-position': "'BOTTOM'"}
+
+
+def test_parse_ignores_comments_blank_lines_and_keys_outside_sections():
+    sections = DconfKeyfile.parse("stray=1\n# comment\n\n[a/b]\n  key = 'value'  \nnot-a-key\n")
+    
+    assert sections == {'a/b': {'key': "'value'"}}
+
+
+def test_parse_merges_repeated_sections():
+    sections = DconfKeyfile.parse("[a]\nx=1\n\n[b]\ny=2\n\n[a]\nz=3\n")
+    
+    assert sections == {'a': {'x': '1', 'z': '3'}, 'b': {'y': '2'}}
+
+
+def test_serialize_round_trips():
+    sections = DconfKeyfile.parse(DUMP)
+    
+    assert DconfKeyfile.parse(DconfKeyfile.serialize(sections)) == sections
+
+
+def test_serialize_skips_empty_sections():
+    assert DconfKeyfile.serialize({'a': {}, 'b': {'x': '1'}}) == "[b]\nx=1\n"
+    assert DconfKeyfile.serialize({}) == ""
+
+
+def test_iter_sections_yields_sections_as_they_complete():
+    sections = DconfKeyfile.iter_sections(iter(DUMP.splitlines()))
+    
+    assert next(sections) == ('/', {'root-key': '1'})
+    assert next(sections)[0] == 'org/gnome/shell'
+
+
+def test_changeset_round_trips():
+    sections = DconfKeyfile.parse(DUMP)
+    changeset = DconfKeyfile.to_changeset('/', sections)
+    
+    assert changeset['/root-key'] == '1'
+    assert changeset['/org/gnome/shell/extensions/dash-to-dock/dock-position'] == "'BOTTOM'"
+    assert DconfKeyfile.from_changeset(changeset) == sections
+
+
+def test_to_changeset_below_a_load_root():
+    changeset = DconfKeyfile.to_changeset('/org/gnome/shell/', {'/': {'a': '1'}, 'extensions/x': {'b': '2'}})
+    
+    assert changeset == {'/org/gnome/shell/a': '1', '/org/gnome/shell/extensions/x/b': '2'}
+
+
+def test_from_changeset_skips_resets():
+    changeset = {'/a/b/x': '1', '/a/b/y': None, '/a/c/': None}
+    
+    assert DconfKeyfile.from_changeset(changeset) == {'a/b': {'x': '1'}}
@@ -0,0 +1,154 @@
+import time
+
+import layout_engine
+import layout_sanitizer
+from layout_engine import LayoutEngine
+
+
+def test_compute_changes_keeps_only_differing_keys():
+    target = {'/a/x': '1', '/a/y': "'new'", '/a/z': 'true'}
+    current = {'/a/x': '1', '/a/y': "'old'", '/b/other': '5'}
+    
+    assert LayoutEngine.compute_changes(target, current) == {'/a/y': "'new'", '/a/z': 'true'}
+
+
+def test_compute_changes_ignores_surrounding_whitespace():
+    assert LayoutEngine.compute_changes({'/a/x': "'v'"}, {'/a/x': " 'v' "}) == {}
+
+
+def test_compute_changes_with_nothing_current_writes_everything():
+    target = {'/a/x': '1', '/a/y': '2'}
+    
+    assert LayoutEngine.compute_changes(target, {}) == target
+
+
+def test_route_sections_places_relative_sections_under_the_shell():
+    changeset = LayoutEngine.route_sections({
+        '/': {'favorite-apps': "['a.desktop']"},
+        'extensions/dash-to-dock': {'dock-position': "'BOTTOM'"},
+    })
+    
+    assert changeset == {
+        '/org/gnome/shell/favorite-apps': "['a.desktop']",
+        '/org/gnome/shell/extensions/dash-to-dock/dock-position': "'BOTTOM'",
+    }
+
+
+def test_route_sections_keeps_absolute_sections():
+    changeset = LayoutEngine.route_sections({
+        'org/gnome/desktop/interface': {'clock-format': "'24h'"},
+        '/com/github/app': {'x': '1'},
+    })
+    
+    assert changeset == {
+        '/org/gnome/desktop/interface/clock-format': "'24h'",
+        '/com/github/app/x': '1',
+    }
+
+
+def test_route_sections_prefers_relative_over_absolute():
+    changeset = LayoutEngine.route_sections({
+        'extensions/dash-to-dock': {'dock-position': "'LEFT'"},
+        'org/gnome/shell/extensions/dash-to-dock': {'dock-position': "'BOTTOM'", 'autohide': 'true'},
+    })
+    
+    assert changeset == {
+        '/org/gnome/shell/extensions/dash-to-dock/dock-position': "'LEFT'",
+        '/org/gnome/shell/extensions/dash-to-dock/autohide': 'true',
+    }
+
+
+def test_route_sections_skips_unmappable_sections_and_keys():
+    changeset = LayoutEngine.route_sections({
+        'extensions//broken': {'a': '1'},
+        'extensions/with space': {'b': '2'},
+        'extensions/ok': {'nested/key': '3', 'c': '4'},
+    })
+    
+    assert changeset == {'/org/gnome/shell/extensions/ok/c': '4'}
+
+
+def test_read_keys_dumps_only_the_written_directories(monkeypatch):
+    dumped = []
+    
+    def dump(root):
+        dumped.append(root)
+        return {'/': {'a': '1', 'unrelated': '2'}, 'extensions/x': {'b': '3'}}
+    
+    monkeypatch.setattr(layout_engine.DconfClient, 'dump', dump)
+    values = LayoutEngine.read_keys([
+        '/org/gnome/shell/a',
+        '/org/gnome/shell/extensions/x/b',
+        '/org/gnome/mutter/edge-tiling',
+    ])
+    
+    assert dumped == ['/org/gnome/mutter/', '/org/gnome/shell/']
+    assert values == {'/org/gnome/shell/a': '1', '/org/gnome/shell/extensions/x/b': '3'}
+
+
+class FakeWatcher:
+    """Replays a list of Notify payloads, one per wait()"""
+    
+    active = True
+    
+    def __init__(self, notifications):
+        self.notifications = list(notifications)
+    
+    def wait(self, timeout):
+        return self.notifications.pop(0) if self.notifications else []
+
+
+def test_wait_for_changes_settles_on_notifications_alone(monkeypatch):
+    def read_keys(paths):
+        raise AssertionError("keys were read back")
+    
+    monkeypatch.setattr(LayoutEngine, 'read_keys', read_keys)
+    watcher = FakeWatcher([
+        ['/org/gnome/shell/favorite-apps', '/org/gnome/shell/favorite-apps-extra'],
+        ['/org/gnome/shell/extensions/x/'],
+    ])
+    changes = {
+        '/org/gnome/shell/favorite-apps': "['a.desktop']",
+        '/org/gnome/shell/extensions/x/b': '1',
+        '/org/gnome/shell/removed': None,
+    }
+    
+    assert LayoutEngine.wait_for_changes(changes, time.monotonic(), watcher=watcher) is not None
+    assert watcher.notifications == []
+
+
+def test_wait_for_changes_times_out_without_notifications(monkeypatch):
+    watcher = FakeWatcher([['/org/gnome/shell/other']])
+    
+    assert LayoutEngine.wait_for_changes({'/org/x/y': '1'}, time.monotonic(), timeout=0.05, watcher=watcher) is None
+
+
+def test_wait_for_changes_rereads_only_pending_keys_without_a_bus(monkeypatch):
+    reads = []
+    
+    def read_keys(paths):
+        reads.append(sorted(paths))
+        return {'/org/x/a': '1'} if len(reads) == 1 else {'/org/x/b': '2'}
+    
+    monkeypatch.setattr(LayoutEngine, 'read_keys', read_keys)
+    watcher = FakeWatcher([])
+    watcher.active = False
+    
+    assert LayoutEngine.wait_for_changes({'/org/x/a': '1', '/org/x/b': '2'}, time.monotonic(), watcher=watcher) is not None
+    assert reads == [['/org/x/a', '/org/x/b'], ['/org/x/b']]
+
+
+def test_compiled_layouts_follow_sanitizer_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(layout_engine, 'LAYOUT_CACHE_DIR', tmp_path / 'cache')
+    monkeypatch.setattr(layout_engine.LayoutCompiler, '_memory', {})
+    layout = tmp_path / 'layout.txt'
+    layout.write_text("[extensions/x]\na=1\n\n[org/gnome/mutter]\nedge-tiling=true\n")
+    
+    assert layout_engine.LayoutCompiler.load(str(layout)) == {
+        '/org/gnome/shell/extensions/x/a': '1',
+        '/org/gnome/mutter/edge-tiling': 'true',
+    }
+    
+    monkeypatch.setattr(layout_sanitizer, 'LAYOUT_ALLOWED_PATHS', ('/org/gnome/shell/',))
+    layout_engine.LayoutCompiler._memory.clear()
+    assert layout_engine.LayoutCompiler.load(str(layout)) == {'/org/gnome/shell/extensions/x/a': '1'}
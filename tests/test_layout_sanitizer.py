@@ -0,0 +1,25 @@
+from layout_sanitizer import LayoutSanitizer
+
+
+def test_layout_directories_are_allowed():
+    assert LayoutSanitizer.is_allowed('/org/gnome/shell/favorite-apps')
+    assert LayoutSanitizer.is_allowed('/org/gnome/shell/extensions/dash-to-dock/dock-position')
+    assert LayoutSanitizer.is_allowed('/org/gnome/mutter/edge-tiling')
+
+
+def test_personal_and_per_machine_settings_are_denied():
+    assert not LayoutSanitizer.is_allowed('/org/gnome/shell/command-history')
+    assert not LayoutSanitizer.is_allowed('/org/gnome/shell/extensions/gsconnect/devices')
+    assert not LayoutSanitizer.is_allowed('/org/gnome/desktop/background/picture-uri')
+    assert not LayoutSanitizer.is_allowed('/org/gnome/desktop/screensaver/primary-color')
+    assert not LayoutSanitizer.is_allowed('/org/gnome/evolution/mail/last-folder')
+
+
+def test_split_keeps_shared_keys_in_the_base():
+    base, overlays = LayoutSanitizer.split({
+        'a': {'/x/shared': '1', '/x/own': '2'},
+        'b': {'/x/shared': '1', '/x/own': '3'},
+    })
+    
+    assert base == {'/x/shared': '1'}
+    assert overlays == {'a': {'/x/own': '2'}, 'b': {'/x/own': '3'}}
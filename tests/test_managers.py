@@ -0,0 +1,52 @@
+import managers
+from dconf_utils import DconfKeyfile
+from managers import BackupManager
+
+BACKUP = """[org/gnome/shell]
+favorite-apps=['a.desktop']
+enabled-extensions=['dash-to-dock']
+
+[org/gnome/shell/extensions/dash-to-dock]
+dock-position='BOTTOM'
+"""
+
+
+def fake_dump(current):
+    """Stand-in for DconfClient.dump() over a changeset of current values"""
+    def dump(root):
+        return DconfKeyfile.from_changeset({
+            '/' + path[len(root):]: value for path, value in current.items() if path.startswith(root)
+        })
+    return dump
+
+
+def test_plan_restore_writes_only_what_differs(tmp_path, monkeypatch):
+    backup_file = tmp_path / 'backup_20240301_100000.txt'
+    backup_file.write_text(BACKUP)
+    monkeypatch.setattr(managers.DconfClient, 'dump', fake_dump({
+        '/org/gnome/shell/favorite-apps': "['a.desktop']",
+        '/org/gnome/shell/enabled-extensions': "['other']",
+        '/org/gnome/shell/extensions/added/key': 'true',
+    }))
+    
+    assert BackupManager.plan_restore(backup_file) == {
+        '/org/gnome/shell/enabled-extensions': "['dash-to-dock']",
+        '/org/gnome/shell/extensions/dash-to-dock/dock-position': "'BOTTOM'",
+        '/org/gnome/shell/extensions/added/key': None,
+    }
+    assert '/org/gnome/shell/extensions/added/key' not in BackupManager.plan_restore(backup_file, reset_added=False)
+
+
+def test_read_scope_keeps_only_keys_in_scope(monkeypatch):
+    monkeypatch.setattr(managers.DconfClient, 'dump', fake_dump({
+        '/org/gnome/shell/favorite-apps': "['a.desktop']",
+        '/org/gnome/shell/enabled-extensions': "['dash-to-dock']",
+        '/org/gnome/shell/extensions/dash-to-dock/dock-position': "'BOTTOM'",
+        '/org/gnome/desktop/interface/clock-format': "'24h'",
+    }))
+    
+    scope = ['/org/gnome/shell/extensions/dash-to-dock/', '/org/gnome/shell/enabled-extensions']
+    assert BackupManager.read_scope(scope) == {
+        '/org/gnome/shell/enabled-extensions': "['dash-to-dock']",
+        '/org/gnome/shell/extensions/dash-to-dock/dock-position': "'BOTTOM'",
+    }
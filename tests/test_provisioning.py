@@ -0,0 +1,112 @@
+import os
+
+from dconf_utils import DconfKeyfile
+from provisioning import OfflineProvisioner, SystemDatabase, compilable_values
+
+CHANGESET = {
+    '/org/gnome/shell/favorite-apps': "['a.desktop']",
+    '/org/gnome/shell/extensions/dash-to-dock/dock-position': "'BOTTOM'",
+    '/org/gnome/shell/extensions/old/': None,
+    '/org/gnome/shell/stale-key': None,
+}
+
+
+def test_write_produces_keyfile_without_resets(tmp_path):
+    database = SystemDatabase(str(tmp_path), 'local')
+    
+    assert database.write(CHANGESET) == 2
+    assert database.keyfile.parent == tmp_path / 'local.d'
+    assert DconfKeyfile.parse(database.keyfile.read_text()) == {
+        'org/gnome/shell': {'favorite-apps': "['a.desktop']"},
+        'org/gnome/shell/extensions/dash-to-dock': {'dock-position': "'BOTTOM'"},
+    }
+    assert not database.lock_file.exists()
+
+
+def test_write_locks_and_unlocks_keys(tmp_path):
+    database = SystemDatabase(str(tmp_path), 'local')
+    
+    database.write(CHANGESET, lock=True)
+    assert database.lock_file.read_text().splitlines() == [
+        '/org/gnome/shell/extensions/dash-to-dock/dock-position',
+        '/org/gnome/shell/favorite-apps',
+    ]
+    
+    database.write(CHANGESET, lock=False)
+    assert not database.lock_file.exists()
+
+
+def test_write_leaves_out_root_level_keys(tmp_path):
+    database = SystemDatabase(str(tmp_path), 'local')
+    
+    assert database.write({'/root-key': '1', '/org/x/y': '2'}, lock=True) == 1
+    assert '[/]' not in database.keyfile.read_text()
+    assert database.lock_file.read_text() == '/org/x/y\n'
+
+
+def user_home(tmp_path):
+    home = tmp_path / 'home'
+    home.mkdir()
+    return home, os.stat(home)
+
+
+def test_user_directories_are_created_and_reused(tmp_path):
+    home, owner = user_home(tmp_path)
+    home_fd = os.open(home, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        config_fd = OfflineProvisioner.open_user_directory(home_fd, '.config', owner)
+        os.close(config_fd)
+        os.close(OfflineProvisioner.open_user_directory(home_fd, '.config', owner))
+    finally:
+        os.close(home_fd)
+    
+    assert (home / '.config').is_dir()
+
+
+def test_symlinked_directories_are_refused(tmp_path):
+    home, _ = user_home(tmp_path)
+    (tmp_path / 'elsewhere').mkdir()
+    (home / '.config').symlink_to(tmp_path / 'elsewhere')
+    
+    result = OfflineProvisioner.provision_home(str(home), {'/org/x/y': '1'}, force=True)
+    
+    assert result[1] is False
+    assert list((tmp_path / 'elsewhere').iterdir()) == []
+
+
+def test_symlinked_database_is_refused(tmp_path):
+    home, _ = user_home(tmp_path)
+    (home / '.config' / 'dconf').mkdir(parents=True)
+    secret = tmp_path / 'secret'
+    secret.write_text('secret')
+    (home / '.config' / 'dconf' / 'user').symlink_to(secret)
+    
+    result = OfflineProvisioner.provision_home(str(home), {'/org/x/y': '1'}, force=True)
+    
+    assert result[1] is False
+    assert secret.read_text() == 'secret'
+
+
+def test_database_is_installed_through_a_fresh_file(tmp_path):
+    home, owner = user_home(tmp_path)
+    dconf_dir = home / '.config' / 'dconf'
+    dconf_dir.mkdir(parents=True)
+    target = tmp_path / 'target'
+    target.write_text('untouched')
+    (dconf_dir / 'user.provisioning').symlink_to(target)
+    compiled = tmp_path / 'compiled'
+    compiled.write_bytes(b'database')
+    
+    dir_fd = os.open(dconf_dir, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        OfflineProvisioner.install_database(dir_fd, str(compiled), owner)
+    finally:
+        os.close(dir_fd)
+    
+    assert (dconf_dir / 'user').read_bytes() == b'database'
+    assert target.read_text() == 'untouched'
+    assert sorted(path.name for path in dconf_dir.iterdir()) == ['user', 'user.provisioning']
+
+
+def test_compile_leaves_out_root_level_keys():
+    assert compilable_values({'/root-key': '1', '/org/x/y': '2'}) == {'/org/x/y': '2'}
@@ -2,9 +2,7 @@
 Main application window for the Community Layout Switcher application.
 """
 
-import os
 import subprocess
-import tempfile
 import time
 import concurrent.futures
 import gi
@@ -13,13 +11,18 @@ gi.require_version('Adw', '1')
 gi.require_version('Pango', '1.0')
 from gi.repository import Gtk, Adw, Gdk, GLib, Pango, Gio
 
-from constants import LAYOUTS, EXTENSIONS
+from constants import EXTENSIONS, TEST_REVERT_SECONDS, PREVIEW_THUMBNAIL_SIZE
 from translation import TranslationManager
 from managers import (
     ThemeManager, BackupManager, ExtensionManager, 
-    SystemUtils, SettingsManager
+    SystemUtils, SettingsManager, AssetResolver
 )
-from ui_components import LayoutRow, ThemeCard, EffectCard
+from ui_components import LayoutItem, LayoutRow, ThemeCard, EffectCard
+from layout_engine import LayoutEngine, LayoutJournal
+from layout_catalog import LayoutCatalog
+from dconf_utils import DconfKeyfile, DconfWriter, DconfWatcher
+from apply_scheduler import ApplyScheduler
+from thumbnails import TextureLoader
 
 
 class BigAppearanceWindow(Adw.ApplicationWindow):
@@ -47,6 +50,8 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
         self.test_mode = False
         self.backup_created = False
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self.scheduler = ApplyScheduler(self.executor)
+        self.preview_loader = TextureLoader()
         
         # Create UI components
         self.create_ui()
@@ -84,6 +89,7 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
         # Create menu model
         menu = Gio.Menu()
         menu.append(self.translator._("backup_restore"), "app.restore_backup")
+        menu.append(self.translator._("cleanup_settings"), "app.cleanup_settings")
         menu.append(self.translator._("about"), "app.about")
         menu.append(self.translator._("quit"), "app.quit")
         
@@ -272,27 +278,30 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
         scrolled_window.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
         scrolled_window.set_vexpand(True)
         
-        # Layout list box
-        self.layout_list_box = Gtk.ListBox()
-        self.layout_list_box.set_selection_mode(Gtk.SelectionMode.SINGLE)
-        self.layout_list_box.connect("row-selected", self.on_layout_row_selected)
+        # Layout list; rows are only created for the visible part of the catalog
+        layouts = LayoutCatalog.layouts()
+        self.layout_store = Gio.ListStore(item_type=LayoutItem)
+        self.layout_store.splice(0, 0, [LayoutItem(*layout) for layout in layouts])
+        self.layout_selection = Gtk.SingleSelection(model=self.layout_store)
+        self.layout_selection.connect("notify::selected-item", self.on_layout_row_selected)
         
-        # Create layout rows
-        self.layout_buttons = []
-        for name, config_file, icon_file, fallback_icon in LAYOUTS:
-            row = LayoutRow(name, icon_file, fallback_icon, config_file, self.translator)
-            self.layout_list_box.append(row)
-            self.layout_buttons.append((row, name, config_file))
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", lambda factory, list_item: list_item.set_child(LayoutRow()))
+        factory.connect("bind", lambda factory, list_item: list_item.get_child().bind(list_item.get_item()))
+        factory.connect("unbind", lambda factory, list_item: list_item.get_child().unbind())
         
-        scrolled_window.set_child(self.layout_list_box)
+        self.layout_list_view = Gtk.ListView(model=self.layout_selection, factory=factory)
+        self.layout_list_view.add_css_class("layout-list")
+        
+        scrolled_window.set_child(self.layout_list_view)
         sidebar_box.append(scrolled_window)
         
         paned.set_end_child(sidebar_box)
         container.append(paned)
         
         # Select first layout by default
-        if LAYOUTS:
-            self.select_layout_item((LAYOUTS[0][0], LAYOUTS[0][1]))
+        if layouts:
+            self.select_layout_item((layouts[0][0], layouts[0][1]))
         
         return container
     
@@ -452,25 +461,19 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
         scrolled_window.set_child(flow_box)
         return scrolled_window
     
-    def on_layout_row_selected(self, list_box, row):
-        """Handle row selection (single click)"""
-        if self.updating_selection or row is None:
+    def on_layout_row_selected(self, selection, pspec):
+        """Handle a change of the selected layout"""
+        item = selection.get_selected_item()
+        if self.updating_selection or item is None:
             return
-            
-        # Get the layout data directly from the row
-        name = row.layout_name
-        config_file = row.config_file
         
         # Select the item
-        self.select_layout_item((name, config_file))
+        self.select_layout_item((item.layout_name, item.config_file))
     
     def select_layout_item(self, item):
         """Select an item and update the preview"""
         self.selected_layout_item = item
         
-        # Clear previous selection
-        self.clear_layout_selection()
-        
         # Update preview
         name, config_file = item
         self.update_layout_preview(name)
@@ -482,45 +485,41 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
         self.preview_description.set_text(self.translator._("description_layout").format(layout=name))
         
         # Try to load preview image
-        icon_path = None
-        for layout in LAYOUTS:
-            if layout[0] == name:
-                icon_path = SystemUtils.find_file(layout[2], ['icons'])
-                break
+        width, height = PREVIEW_THUMBNAIL_SIZE
+        layout = LayoutCatalog.find(name)
+        icon_path = AssetResolver.resolve(layout[2], max(width, height)) if layout else None
         
-        # Set image or fallback
-        if icon_path and os.path.exists(icon_path):
-            self.preview_image.set_filename(icon_path)
+        # Decode the thumbnail in the background; the previous image stays until it arrives
+        if icon_path:
+            self.preview_loader.load(icon_path, width, height, self.on_preview_texture)
         else:
-            # Use fallback icon
-            fallback_image = Gtk.Image.new_from_icon_name("view-grid-symbolic")
-            fallback_image.set_pixel_size(80)
-            self.preview_image.set_paintable(fallback_image.get_paintable())
+            self.preview_loader.cancel()
+            self.on_preview_texture(None)
     
-    def highlight_selected_layout_row(self, name):
-        """Highlight the selected row in the list"""
-        self.updating_selection = True
-        
-        for row, row_name, _ in self.layout_buttons:
-            if row_name == name:
-                row.add_css_class("selected")
-                self.layout_list_box.select_row(row)
-                break
+    def on_preview_texture(self, texture):
+        """Show the decoded preview of the selected layout, or the fallback icon"""
+        if texture:
+            self.preview_image.set_paintable(texture)
+            return
         
-        self.updating_selection = False
+        fallback_image = Gtk.Image.new_from_icon_name("view-grid-symbolic")
+        fallback_image.set_pixel_size(80)
+        self.preview_image.set_paintable(fallback_image.get_paintable())
     
-    def clear_layout_selection(self):
-        """Clear selection from all rows"""
+    def highlight_selected_layout_row(self, name):
+        """Select the row of a layout in the list"""
         self.updating_selection = True
         
-        for row, _, _ in self.layout_buttons:
-            row.remove_css_class("selected")
+        for position in range(self.layout_store.get_n_items()):
+            if self.layout_store.get_item(position).layout_name == name:
+                self.layout_selection.set_selected(position)
+                break
         
         self.updating_selection = False
     
     def on_test_layout_clicked(self, widget):
         """Handle test button click"""
-        if self.applying or not hasattr(self, 'selected_layout_item'):
+        if not self.selected_layout_item:
             return
         
         # Ask user if they want to test the layout
@@ -547,7 +546,7 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
     
     def on_apply_layout_clicked(self, widget):
         """Handle apply button click"""
-        if self.applying or not hasattr(self, 'selected_layout_item'):
+        if not self.selected_layout_item:
             return
         
         # Check if GNOME Shell extensions are enabled
@@ -571,17 +570,20 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
             dialog.present()
             return
         
-        # Disable button and show spinner
+        # Show the spinner until the latest request has run
         self.set_applying_state(True)
         
-        # Start applying in a separate thread
-        self.executor.submit(self.apply_selected_layout)
+        # Start applying in a separate thread; a newer click replaces a request still waiting
+        test_mode, self.test_mode = self.test_mode, False
+        self.scheduler.submit("layout", self.apply_selected_layout, self.selected_layout_item, test_mode)
     
     def on_backup_dialog_response(self, dialog, response):
         """Handle response from backup dialog"""
         if response == "backup":
             # Create backup
-            backup_file = BackupManager.create_backup()
+            backup_file = BackupManager.create_backup(
+                self.get_backup_scope(), self.settings_manager.get("backup_retention")
+            )
             if backup_file:
                 self.backup_created = True
                 self.show_toast(self.translator._("backup_created"))
@@ -592,11 +594,25 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
         self.on_apply_layout_clicked(None)
         dialog.destroy()
     
+    def get_backup_scope(self):
+        """Return the paths the selected layout touches, or None for a full backup"""
+        if not self.settings_manager.get("scoped_backups", True) or not self.selected_layout_item:
+            return None
+        
+        try:
+            config_path = LayoutCatalog.config_path(self.selected_layout_item[1])
+            return LayoutEngine.backup_scope(config_path) if config_path else None
+        except Exception as e:
+            print(f"Could not determine backup scope, backing up everything: {e}")
+            return None
+    
     def set_applying_state(self, applying):
-        """Set the applying state of the UI"""
+        """Show or hide the spinner of a layout being applied
+        
+        The buttons stay enabled: clicking again while a layout is applied
+        replaces the request instead of being ignored.
+        """
         self.applying = applying
-        self.apply_button.set_sensitive(not applying)
-        self.test_button.set_sensitive(not applying)
         
         if applying:
             self.spinner.set_visible(True)
@@ -605,29 +621,42 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
             self.spinner.set_visible(False)
             self.spinner.stop()
     
-    def apply_selected_layout(self):
-        """Apply the selected layout in a separate thread"""
+    def apply_selected_layout(self, layout_item, test_mode=False, token=None):
+        """Apply a layout in a separate thread, giving up once a newer request supersedes it"""
+        def superseded():
+            return token is not None and token.cancelled()
+        
         try:
-            name, config_file = self.selected_layout_item
+            if superseded():
+                return
+            
+            name, config_file = layout_item
             GLib.idle_add(self.update_status, self.translator._("applying").format(layout=name))
             
             # Find config file path
-            config_path = SystemUtils.find_file(config_file, ['layouts'])
+            config_path = LayoutCatalog.config_path(config_file)
             if not config_path:
                 GLib.idle_add(self.update_status, self.translator._("error_config").format(file=config_file))
                 return
             
             # Apply GNOME layout
-            self.apply_gnome_layout(config_path)
-            
-            # Give desktop time to apply changes
-            time.sleep(0.5)
-            
-            GLib.idle_add(self.update_status, self.translator._("success").format(layout=name))
+            # Listen before writing, so dconf's notifications settle the keys instead of sleeping blindly
+            started = time.monotonic()
+            with DconfWatcher() as watcher:
+                if superseded():
+                    return
+                changes = self.apply_gnome_layout(config_path)
+                if superseded():
+                    return
+                latency = LayoutEngine.wait_for_changes(changes, started, watcher=watcher)
+            if latency is None:
+                GLib.idle_add(self.update_status, self.translator._("error_applying").format(error="Changes did not settle in time"))
+            else:
+                print(f"Layout {name} settled in {latency * 1000:.0f} ms")
+                GLib.idle_add(self.update_status, self.translator._("success").format(layout=name) + f" ({latency * 1000:.0f} ms)")
             
             # If in test mode, show dialog to keep or revert changes
-            if self.test_mode:
-                self.test_mode = False
+            if test_mode and not superseded():
                 GLib.idle_add(self.show_test_result_dialog)
         except subprocess.TimeoutExpired:
             GLib.idle_add(self.update_status, self.translator._("error_applying").format(error="Operation timed out"))
@@ -636,8 +665,13 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
         except Exception as e:
             GLib.idle_add(self.update_status, self.translator._("error").format(error=str(e)))
         finally:
-            # Always reset applying state
-            GLib.idle_add(self.set_applying_state, False)
+            GLib.idle_add(self.on_apply_finished, token)
+    
+    def on_apply_finished(self, token):
+        """Hide the spinner unless a newer layout request is still on its way"""
+        if token is None or not token.cancelled():
+            self.set_applying_state(False)
+        return False
     
     def show_test_result_dialog(self):
         """Show dialog to keep or revert test changes"""
@@ -651,44 +685,75 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
         dialog.add_response("keep", self.translator._("test_layout_keep"))
         dialog.set_response_appearance("keep", Adw.ResponseAppearance.SUGGESTED)
         
-        dialog.connect("response", self.on_test_result_dialog_response)
+        # Revert automatically unless the user decides in time
+        seconds = self.settings_manager.get("auto_revert_seconds", TEST_REVERT_SECONDS)
+        countdown = {"remaining": seconds, "source": None}
+        if seconds > 0:
+            self.update_revert_countdown(dialog, seconds)
+            countdown["source"] = GLib.timeout_add_seconds(1, self.on_revert_countdown_tick, dialog, countdown)
+        
+        dialog.connect("response", self.on_test_result_dialog_response, countdown)
         dialog.present()
     
-    def on_test_result_dialog_response(self, dialog, response):
+    def update_revert_countdown(self, dialog, seconds):
+        """Show the remaining time before a tested layout is reverted"""
+        dialog.set_body(
+            self.translator._("test_layout_message") + "\n\n" +
+            self.translator._("test_layout_countdown").format(seconds=seconds)
+        )
+    
+    def on_revert_countdown_tick(self, dialog, countdown):
+        """Count down once per second and revert when time runs out"""
+        countdown["remaining"] -= 1
+        if countdown["remaining"] > 0:
+            self.update_revert_countdown(dialog, countdown["remaining"])
+            return True
+        
+        countdown["source"] = None
+        dialog.response("revert")
+        return False
+    
+    def on_test_result_dialog_response(self, dialog, response, countdown):
         """Handle response from test result dialog"""
+        if countdown["source"] is not None:
+            GLib.source_remove(countdown["source"])
+            countdown["source"] = None
+        
         if response == "revert":
-            # Restore from backup
-            backup_file = BackupManager.get_latest_backup()
-            if backup_file:
-                if BackupManager.restore_backup(backup_file):
+            # Put back only the keys the test apply changed
+            try:
+                if LayoutJournal.revert() is not None:
                     self.show_toast(self.translator._("backup_restore_success"))
                 else:
-                    self.show_toast(self.translator._("backup_restore_error").format(error=self.translator._("unknown")))
+                    self.revert_from_backup()
+            except Exception as e:
+                self.show_toast(self.translator._("backup_restore_error").format(error=str(e)))
+        else:
+            LayoutJournal.clear()
         
         dialog.destroy()
     
-    def apply_gnome_layout(self, config_path):
-        """Apply GNOME layout using dconf"""
-        # Use a more robust approach to apply the layout
-        with open(config_path, 'r') as f:
-            config_data = f.read()
-        
-        # Write to a temporary file to avoid issues
-        with tempfile.NamedTemporaryFile(mode='w', delete=False) as temp_file:
-            temp_file.write(config_data)
-            temp_file_path = temp_file.name
+    def revert_from_backup(self):
+        """Fall back to the latest backup when no journal is available"""
+        backup_file = BackupManager.get_latest_backup()
+        if not backup_file:
+            self.show_toast(self.translator._("backup_restore_error").format(error=self.translator._("No backup found")))
+            return
         
-        try:
-            # Apply the configuration
-            subprocess.run(
-                ["dconf", "load", "/org/gnome/shell/"],
-                stdin=open(temp_file_path, 'r'),
-                check=True,
-                timeout=10
-            )
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
+        future = self.executor.submit(BackupManager.restore_backup, backup_file)
+        future.add_done_callback(lambda f: GLib.idle_add(self.on_revert_finished, f))
+    
+    def on_revert_finished(self, future):
+        """Report the result of reverting from a backup"""
+        if future.result():
+            self.show_toast(self.translator._("backup_restore_success"))
+        else:
+            self.show_toast(self.translator._("backup_restore_error").format(error=self.translator._("unknown")))
+        return False
+    
+    def apply_gnome_layout(self, config_path):
+        """Apply GNOME layout using dconf, writing only the keys that change"""
+        return LayoutEngine.apply_layout(config_path)
     
     def update_status(self, message):
         """Update the status bar safely from any thread"""
@@ -748,12 +813,17 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
     
     def apply_theme(self, theme_name: str, theme_type: str):
         """Apply a theme using gsettings"""
-        # Start applying in a separate thread
-        self.executor.submit(self._apply_theme_thread, theme_name, theme_type)
+        # Start applying in a separate thread; each theme type keeps only the latest request
+        self.scheduler.submit(theme_type, self._apply_theme_thread, theme_name, theme_type)
     
-    def _apply_theme_thread(self, theme_name: str, theme_type: str):
+    def _apply_theme_thread(self, theme_name: str, theme_type: str, token=None):
         """Apply the selected theme in a separate thread"""
         try:
+            # Skip requests superseded by a newer click before spawning anything
+            if token is not None and token.cancelled():
+                print(f"Skipping superseded {theme_type} theme: {theme_name}")
+                return
+            
             if theme_type == "shell":
                 print(f"Applying shell theme: {theme_name}")
                 GLib.idle_add(self.update_status, self.translator._("applying_shell").format(theme=theme_name))
@@ -773,28 +843,14 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
                 
                 # Apply shell theme using dconf
                 try:
-                    print(f"Running: dconf write /org/gnome/shell/extensions/user-theme/name '{theme_name}'")
-                    subprocess.run(
-                        ["dconf", "write", "/org/gnome/shell/extensions/user-theme/name", f"'{theme_name}'"],
-                        check=True
-                    )
-                    print("Command completed successfully")
+                    if token is not None and token.cancelled():
+                        return
                     
-                    # Verify the setting
-                    result = subprocess.run(
-                        ["dconf", "read", "/org/gnome/shell/extensions/user-theme/name"],
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    current_theme = result.stdout.strip().strip("'").strip('"')
-                    print(f"Current shell theme after setting: {current_theme}")
+                    print(f"Writing /org/gnome/shell/extensions/user-theme/name = '{theme_name}'")
+                    DconfWriter.write({"/org/gnome/shell/extensions/user-theme/name": DconfKeyfile.quote_string(theme_name)})
                     
-                    if current_theme == theme_name:
-                        GLib.idle_add(self.update_status, self.translator._("success_shell").format(theme=theme_name))
-                        GLib.idle_add(self.show_toast, self.translator._("shell_theme_restart"))
-                    else:
-                        GLib.idle_add(self.update_status, self.translator._("error_shell").format(error=f"Theme not set. Current: {current_theme}"))
+                    GLib.idle_add(self.update_status, self.translator._("success_shell").format(theme=theme_name))
+                    GLib.idle_add(self.show_toast, self.translator._("shell_theme_restart"))
                 except subprocess.CalledProcessError as e:
                     print(f"Error applying shell theme: {e}")
                     GLib.idle_add(self.update_status, self.translator._("error_shell").format(error=str(e)))
@@ -807,27 +863,11 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
                 
                 # Apply GTK theme using dconf
                 try:
-                    print(f"Running: dconf write /org/gnome/desktop/interface/gtk-theme '{theme_name}'")
-                    subprocess.run(
-                        ["dconf", "write", "/org/gnome/desktop/interface/gtk-theme", f"'{theme_name}'"],
-                        check=True
-                    )
-                    
-                    # Verify the setting
-                    result = subprocess.run(
-                        ["dconf", "read", "/org/gnome/desktop/interface/gtk-theme"],
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    current_theme = result.stdout.strip().strip("'").strip('"')
-                    print(f"Current GTK theme after setting: {current_theme}")
+                    print(f"Writing /org/gnome/desktop/interface/gtk-theme = '{theme_name}'")
+                    DconfWriter.write({"/org/gnome/desktop/interface/gtk-theme": DconfKeyfile.quote_string(theme_name)})
                     
-                    if current_theme == theme_name:
-                        GLib.idle_add(self.update_status, self.translator._("success_gtk").format(theme=theme_name))
-                        GLib.idle_add(self.show_toast, self.translator._("gtk_theme_restart"))
-                    else:
-                        GLib.idle_add(self.update_status, self.translator._("error_gtk").format(error=f"Theme not set. Current: {current_theme}"))
+                    GLib.idle_add(self.update_status, self.translator._("success_gtk").format(theme=theme_name))
+                    GLib.idle_add(self.show_toast, self.translator._("gtk_theme_restart"))
                 except subprocess.CalledProcessError as e:
                     GLib.idle_add(self.update_status, self.translator._("error_gtk").format(error=str(e)))
                 except Exception as e:
@@ -838,27 +878,11 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
                 
                 # Apply icon theme using dconf
                 try:
-                    print(f"Running: dconf write /org/gnome/desktop/interface/icon-theme '{theme_name}'")
-                    subprocess.run(
-                        ["dconf", "write", "/org/gnome/desktop/interface/icon-theme", f"'{theme_name}'"],
-                        check=True
-                    )
-                    
-                    # Verify the setting
-                    result = subprocess.run(
-                        ["dconf", "read", "/org/gnome/desktop/interface/icon-theme"],
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    current_theme = result.stdout.strip().strip("'").strip('"')
-                    print(f"Current icon theme after setting: {current_theme}")
+                    print(f"Writing /org/gnome/desktop/interface/icon-theme = '{theme_name}'")
+                    DconfWriter.write({"/org/gnome/desktop/interface/icon-theme": DconfKeyfile.quote_string(theme_name)})
                     
-                    if current_theme == theme_name:
-                        GLib.idle_add(self.update_status, self.translator._("success_icons").format(theme=theme_name))
-                        GLib.idle_add(self.show_toast, self.translator._("icon_theme_restart"))
-                    else:
-                        GLib.idle_add(self.update_status, self.translator._("error_icons").format(error=f"Theme not set. Current: {current_theme}"))
+                    GLib.idle_add(self.update_status, self.translator._("success_icons").format(theme=theme_name))
+                    GLib.idle_add(self.show_toast, self.translator._("icon_theme_restart"))
                 except subprocess.CalledProcessError as e:
                     GLib.idle_add(self.update_status, self.translator._("error_icons").format(error=str(e)))
                 except Exception as e:
@@ -938,16 +962,15 @@ class BigAppearanceWindow(Adw.ApplicationWindow):
         """Load CSS for styling"""
         css_provider = Gtk.CssProvider()
         css_provider.load_from_data(b"""
-            .layout-row {
+            .layout-list > row {
                 border-radius: 8px;
                 margin: 4px;
                 transition: all 200ms ease;
-                min-height: 70px;
             }
-            .layout-row:hover {
+            .layout-list > row:hover {
                 background-color: alpha(@theme_fg_color, 0.1);
             }
-            .layout-row.selected {
+            .layout-list > row:selected {
                 background-color: @theme_selected_bg_color;
                 color: @theme_selected_fg_color;
             }
@@ -6,11 +6,12 @@ import os
 import gi
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
-from gi.repository import Gtk, Adw, Gio
+from gi.repository import Gtk, Adw, Gio, GLib
 
 from constants import APP_ID
 from translation import _
 from managers import BackupManager
+from layout_engine import DconfCleanup
 from app_window import BigAppearanceWindow
 
 
@@ -38,6 +39,10 @@ class BigAppearanceApp(Adw.Application):
         restore_action = Gio.SimpleAction.new("restore_backup", None)
         restore_action.connect("activate", self.on_restore_backup)
         self.add_action(restore_action)
+        
+        cleanup_action = Gio.SimpleAction.new("cleanup_settings", None)
+        cleanup_action.connect("activate", self.on_cleanup_settings)
+        self.add_action(cleanup_action)
     
     def on_activate(self, app):
         """Handle application activation"""
@@ -103,25 +108,103 @@ class BigAppearanceApp(Adw.Application):
             active_window.show_toast(_("backup_restore_error").format(error=_("No backup found")))
             return
         
+        # Compare the backup with the current settings off the main thread
+        future = active_window.executor.submit(BackupManager.plan_restore, backup_file)
+        future.add_done_callback(lambda f: GLib.idle_add(self.on_restore_planned, backup_file, f))
+    
+    def on_restore_planned(self, backup_file, future):
+        """Ask for confirmation, showing how many keys the restore will touch"""
+        active_window = self.get_active_window()
+        try:
+            changes = future.result()
+        except Exception as e:
+            active_window.show_toast(_("backup_restore_error").format(error=str(e)))
+            return False
+        
+        if not changes:
+            active_window.show_toast(_("backup_restore_nothing"))
+            return False
+        
+        written = sum(value is not None for value in changes.values())
         dialog = Adw.MessageDialog(
             transient_for=active_window,
             heading=_("backup_restore_title"),
-            body=_("backup_restore_message"),
+            body=_("backup_restore_message") + "\n\n" +
+                 _("backup_restore_summary").format(changed=written, reset=len(changes) - written),
         )
         
         dialog.add_response("cancel", _("cancel"))
         dialog.add_response("restore", _("backup_restore"))
         dialog.set_response_appearance("restore", Adw.ResponseAppearance.SUGGESTED)
         
-        dialog.connect("response", self.on_restore_dialog_response, backup_file)
+        dialog.connect("response", self.on_restore_dialog_response, backup_file, changes)
         dialog.present()
+        return False
     
-    def on_restore_dialog_response(self, dialog, response, backup_file):
+    def on_restore_dialog_response(self, dialog, response, backup_file, changes):
         """Handle response from restore dialog"""
         if response == "restore":
-            if BackupManager.restore_backup(backup_file):
-                self.get_active_window().show_toast(_("backup_restore_success"))
-            else:
-                self.get_active_window().show_toast(_("backup_restore_error").format(error=_("unknown")))
+            future = self.get_active_window().executor.submit(BackupManager.restore_backup, backup_file, changes)
+            future.add_done_callback(lambda f: GLib.idle_add(self.on_restore_finished, f))
+        
+        dialog.destroy()
+    
+    def on_restore_finished(self, future):
+        """Report the result of a restore"""
+        if future.result():
+            self.get_active_window().show_toast(_("backup_restore_success"))
+        else:
+            self.get_active_window().show_toast(_("backup_restore_error").format(error=_("unknown")))
+        return False
+    
+    def on_cleanup_settings(self, action, param):
+        """Handle clean up settings action"""
+        # Scanning a large database can take a while, so keep it off the main thread
+        future = self.get_active_window().executor.submit(DconfCleanup.scan)
+        future.add_done_callback(lambda f: GLib.idle_add(self.on_cleanup_scanned, f))
+    
+    def on_cleanup_scanned(self, future):
+        """Ask for confirmation once the stray settings are known"""
+        active_window = self.get_active_window()
+        try:
+            subtrees = future.result()
+        except Exception as e:
+            active_window.show_toast(_("cleanup_error").format(error=str(e)))
+            return False
+        
+        if not subtrees:
+            active_window.show_toast(_("cleanup_nothing"))
+            return False
+        
+        keys = sum(count for _, count, _ in subtrees)
+        size = sum(size for _, _, size in subtrees)
+        dialog = Adw.MessageDialog(
+            transient_for=active_window,
+            heading=_("cleanup_title"),
+            body=_("cleanup_message").format(keys=keys, size=max(1, size // 1024), folders=len(subtrees)),
+        )
+        
+        dialog.add_response("cancel", _("cancel"))
+        dialog.add_response("cleanup", _("cleanup"))
+        dialog.set_response_appearance("cleanup", Adw.ResponseAppearance.DESTRUCTIVE)
+        
+        dialog.connect("response", self.on_cleanup_dialog_response, subtrees)
+        dialog.present()
+        return False
+    
+    def on_cleanup_dialog_response(self, dialog, response, subtrees):
+        """Handle response from clean up dialog"""
+        if response == "cleanup":
+            future = self.get_active_window().executor.submit(DconfCleanup.clean, subtrees)
+            future.add_done_callback(lambda f: GLib.idle_add(self.on_cleanup_finished, f))
         
         dialog.destroy()
+    
+    def on_cleanup_finished(self, future):
+        """Report the result of a clean up"""
+        try:
+            removed = future.result()
+            self.get_active_window().show_toast(_("cleanup_success").format(keys=removed))
+        except Exception as e:
+            self.get_active_window().show_toast(_("cleanup_error").format(error=str(e)))
+        return False
@@ -0,0 +1,69 @@
+"""
+Apply scheduling for the Community Layout Switcher application.
+"""
+
+import threading
+import concurrent.futures
+from typing import Callable, Dict, Set, Tuple
+
+
+class ApplyToken:
+    """Lets a running job find out that a newer request replaced it"""
+    
+    def __init__(self, scheduler: 'ApplyScheduler', lane: str, generation: int):
+        self.scheduler = scheduler
+        self.lane = lane
+        self.generation = generation
+    
+    def cancelled(self) -> bool:
+        """Check whether a newer request was submitted to the same lane"""
+        return self.scheduler.generation(self.lane) != self.generation
+
+
+class ApplyScheduler:
+    """Runs at most one job per lane and keeps only the latest pending request
+    
+    Lanes are independent targets such as "layout", "gtk", "icons" and
+    "shell". Submitting to a busy lane replaces whatever was waiting there
+    and marks the running job as superseded; jobs receive an ApplyToken as
+    the `token` keyword argument and should check it before expensive work.
+    """
+    
+    def __init__(self, executor: concurrent.futures.Executor):
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._generations: Dict[str, int] = {}
+        self._pending: Dict[str, Tuple[Callable, tuple, int]] = {}
+        self._running: Set[str] = set()
+    
+    def generation(self, lane: str) -> int:
+        """Return the number of the latest request submitted to a lane"""
+        with self._lock:
+            return self._generations.get(lane, 0)
+    
+    def submit(self, lane: str, func: Callable, *args):
+        """Request `func(*args, token=...)` to run on a lane, superseding older requests"""
+        with self._lock:
+            generation = self._generations.get(lane, 0) + 1
+            self._generations[lane] = generation
+            self._pending[lane] = (func, args, generation)
+            if lane in self._running:
+                return
+            self._running.add(lane)
+        
+        self.executor.submit(self._run_lane, lane)
+    
+    def _run_lane(self, lane: str):
+        """Run the pending jobs of a lane until none is left"""
+        while True:
+            with self._lock:
+                job = self._pending.pop(lane, None)
+                if job is None:
+                    self._running.discard(lane)
+                    return
+            
+            func, args, generation = job
+            try:
+                func(*args, token=ApplyToken(self, lane, generation))
+            except Exception as e:
+                print(f"Error running {lane} job: {e}")
@@ -0,0 +1,461 @@
+"""
+Backup store for the Community Layout Switcher application.
+
+Backups are kept content-addressed: every large dconf section is stored
+once as a blob named after its hash, and each backup is a small manifest
+mapping its sections to blobs. The many small sections of a backup are
+packed together into one more blob, since compressing them one by one
+would save nothing. Consecutive backups share almost all of their blobs.
+Blobs are compressed (see BACKUP_COMPRESSION) and named after the SHA-256
+of their uncompressed contents, which is verified whenever they are read.
+
+A compact index lists the backups in order, so listing them and finding the
+latest one read a single file. After each backup, old ones are evicted in
+the background according to a retention policy. Writers hold a lock file,
+so the GUI and the command line can share the store.
+"""
+
+import os
+import fcntl
+import gzip
+import lzma
+import json
+import time
+import hashlib
+import datetime
+import threading
+import contextlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from constants import BACKUP_DIR, BACKUP_RETENTION, BACKUP_COMPRESSION
+from dconf_utils import DconfKeyfile, Sections
+
+# (manifest name, creation time in ISO format, whether the backup is scoped)
+BackupEntry = Tuple[str, str, bool]
+
+# Unreferenced blobs younger than this are left alone by the garbage
+# collector, since a backup being written may be about to reference them
+BLOB_GRACE_SECONDS = 300
+
+# Blobs the garbage collector checks per hold of the store lock
+BLOB_GC_BATCH_SIZE = 256
+
+# File suffix and opener of blobs for each BACKUP_COMPRESSION value
+BLOB_FORMATS = {
+    'xz': ('.xz', lzma.open),
+    'gzip': ('.gz', gzip.open),
+    None: ('', open),
+}
+
+# Sections smaller than this are packed into one blob per backup rather than
+# stored on their own; a change to any of them rewrites only that pack
+BLOB_PACK_MAX_BYTES = 1024
+
+# Blobs smaller than this are stored uncompressed, since the container
+# headers would outweigh what compression saves
+BLOB_COMPRESS_MIN_BYTES = 256
+
+# Bytes read at a time when decompressing blobs
+BLOB_CHUNK_SIZE = 64 * 1024
+
+
+class BackupStore:
+    """Stores dconf backups as per-section blobs plus one manifest per backup"""
+    
+    # Bump whenever the manifest or index format changes
+    FORMAT_VERSION = 2
+    # Manifest versions that can still be read; version 1 has no packed sections
+    READABLE_VERSIONS = (1, 2)
+    
+    OBJECTS_DIR = BACKUP_DIR / 'objects'
+    MANIFESTS_DIR = BACKUP_DIR / 'manifests'
+    INDEX_FILE = BACKUP_DIR / 'index.json'
+    LOCK_FILE = BACKUP_DIR / 'store.lock'
+    
+    _lock = threading.RLock()
+    # Guards the cached index separately, so reading it never waits for the store lock
+    _index_lock = threading.Lock()
+    _lock_depth = 0
+    _lock_file = None
+    _entries: Optional[List[BackupEntry]] = None
+    _entries_mtime: Optional[int] = None
+    _pruning = False
+    
+    @staticmethod
+    @contextlib.contextmanager
+    def _locked():
+        """Hold the store lock, which is shared between threads and processes"""
+        with BackupStore._lock:
+            # flock() locks belong to the open file, so only the outermost holder takes it
+            if BackupStore._lock_depth == 0:
+                BackupStore.LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+                BackupStore._lock_file = open(BackupStore.LOCK_FILE, 'a')
+                fcntl.flock(BackupStore._lock_file.fileno(), fcntl.LOCK_EX)
+            BackupStore._lock_depth += 1
+            try:
+                yield
+            finally:
+                BackupStore._lock_depth -= 1
+                if BackupStore._lock_depth == 0:
+                    BackupStore._lock_file.close()
+                    BackupStore._lock_file = None
+    
+    @staticmethod
+    def blob_path(digest: str, compression: Optional[str] = None) -> Path:
+        """Location of a blob, fanned out by the first two hex digits"""
+        return BackupStore.OBJECTS_DIR / digest[:2] / (digest + BLOB_FORMATS[compression][0])
+    
+    @staticmethod
+    def find_blob(digest: str) -> Optional[Tuple[Path, Optional[str]]]:
+        """Return the file of a stored blob and its compression"""
+        for compression in dict.fromkeys([BACKUP_COMPRESSION, *BLOB_FORMATS]):
+            blob_file = BackupStore.blob_path(digest, compression)
+            if blob_file.exists():
+                return blob_file, compression
+        return None
+    
+    @staticmethod
+    def write_blob(data: bytes) -> str:
+        """Store a blob unless an identical one exists, returning its digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        found = BackupStore.find_blob(digest)
+        if found:
+            try:
+                # Mark the blob as in use so a concurrent prune keeps it
+                os.utime(found[0])
+                return digest
+            except FileNotFoundError:
+                pass
+        
+        compression = BACKUP_COMPRESSION if len(data) >= BLOB_COMPRESS_MIN_BYTES else None
+        blob_file = BackupStore.blob_path(digest, compression)
+        blob_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = blob_file.with_name(digest + '.tmp')
+        with BLOB_FORMATS[compression][1](temp_file, 'wb') as f:
+            f.write(data)
+        os.replace(temp_file, blob_file)
+        return digest
+    
+    @staticmethod
+    def read_blob(digest: str) -> bytes:
+        """Decompress a blob, checking it against its digest"""
+        found = BackupStore.find_blob(digest)
+        if found is None:
+            raise FileNotFoundError(f"Backup blob {digest} is missing")
+        
+        blob_file, compression = found
+        checksum = hashlib.sha256()
+        chunks = []
+        with BLOB_FORMATS[compression][1](blob_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(BLOB_CHUNK_SIZE), b''):
+                checksum.update(chunk)
+                chunks.append(chunk)
+        
+        if checksum.hexdigest() != digest:
+            raise ValueError(f"Backup blob {blob_file} is corrupt")
+        return b''.join(chunks)
+    
+    @staticmethod
+    def section_blob(keys: dict) -> bytes:
+        """Canonical text of a section's keys, so equal sections hash equally"""
+        return "".join(f"{key}={value}\n" for key, value in sorted(keys.items())).encode('utf-8')
+    
+    @staticmethod
+    def pack_blob(sections: Dict[str, bytes]) -> bytes:
+        """Canonical keyfile of several sections' blobs, so equal packs hash equally"""
+        return b"\n".join(f"[{section}]\n".encode('utf-8') + data for section, data in sorted(sections.items()))
+    
+    @staticmethod
+    def manifests() -> List[Path]:
+        """All backup manifests on disk, oldest first"""
+        try:
+            return sorted(BackupStore.MANIFESTS_DIR.glob('backup_*.json'))
+        except OSError:
+            return []
+    
+    @staticmethod
+    def read_manifest(manifest_file: Path) -> dict:
+        """Read a manifest, checking its format version"""
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('version') not in BackupStore.READABLE_VERSIONS:
+            raise ValueError(f"Unsupported backup format in {manifest_file}")
+        return manifest
+    
+    @staticmethod
+    def manifest_blobs(manifest: dict) -> Set[str]:
+        """Digests of every blob a manifest references"""
+        blobs = set(manifest['sections'].values())
+        if manifest.get('packed'):
+            blobs.add(manifest['packed'])
+        return blobs
+    
+    @staticmethod
+    def _write_json(path: Path, data: dict):
+        """Write a JSON file atomically"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = path.with_suffix('.tmp')
+        with open(temp_file, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_file, path)
+    
+    @staticmethod
+    def _write_index(entries: List[BackupEntry]):
+        """Store the list of backups and remember it"""
+        BackupStore._write_json(BackupStore.INDEX_FILE, {'version': BackupStore.FORMAT_VERSION, 'backups': entries})
+        with BackupStore._index_lock:
+            BackupStore._entries = list(entries)
+            BackupStore._entries_mtime = BackupStore.INDEX_FILE.stat().st_mtime_ns
+    
+    @staticmethod
+    def _rebuild_index() -> List[BackupEntry]:
+        """Recreate the index from the manifests, e.g. after an upgrade"""
+        entries = []
+        for manifest_file in BackupStore.manifests():
+            try:
+                manifest = BackupStore.read_manifest(manifest_file)
+                entries.append((manifest_file.name, manifest['created'], manifest['scope'] is not None))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring backup {manifest_file}: {e}")
+        
+        try:
+            BackupStore._write_index(entries)
+        except OSError as e:
+            print(f"Could not write backup index: {e}")
+            with BackupStore._index_lock:
+                BackupStore._entries = entries
+                BackupStore._entries_mtime = None
+        return entries
+    
+    @staticmethod
+    def entries() -> List[BackupEntry]:
+        """All backups, oldest first, as listed by the index
+        
+        The index is replaced atomically, so reading it doesn't wait for
+        the store lock; only rebuilding a missing or outdated one does.
+        """
+        with BackupStore._index_lock:
+            try:
+                mtime = BackupStore.INDEX_FILE.stat().st_mtime_ns
+            except OSError:
+                mtime = None
+            if BackupStore._entries is not None and mtime == BackupStore._entries_mtime:
+                return list(BackupStore._entries)
+            
+            try:
+                with open(BackupStore.INDEX_FILE, 'r') as f:
+                    stored = json.load(f)
+                if stored.get('version') != BackupStore.FORMAT_VERSION:
+                    raise ValueError("outdated index")
+                BackupStore._entries = [tuple(entry) for entry in stored['backups']]
+                BackupStore._entries_mtime = mtime
+                return list(BackupStore._entries)
+            except (OSError, ValueError, KeyError, AttributeError, TypeError):
+                pass
+        
+        with BackupStore._locked():
+            return list(BackupStore._rebuild_index())
+    
+    @staticmethod
+    def latest() -> Optional[Path]:
+        """The most recent backup manifest"""
+        entries = BackupStore.entries()
+        if not entries:
+            return None
+        
+        latest = BackupStore.MANIFESTS_DIR / entries[-1][0]
+        if latest.exists():
+            return latest
+        
+        # The index is stale, e.g. manifests were deleted by hand
+        with BackupStore._locked():
+            entries = BackupStore._rebuild_index()
+        return BackupStore.MANIFESTS_DIR / entries[-1][0] if entries else None
+    
+    @staticmethod
+    def save(sections: Iterable[Tuple[str, Dict[str, str]]], scope: Optional[List[str]] = None) -> Path:
+        """Store a backup from (section, keys) pairs, writing each large section as it arrives
+        
+        If nothing changed since the latest backup, that one is returned instead.
+        """
+        with BackupStore._locked():
+            digests = {}
+            small: Dict[str, bytes] = {}
+            for section, keys in sections:
+                if not keys:
+                    continue
+                data = BackupStore.section_blob(keys)
+                if len(data) < BLOB_PACK_MAX_BYTES:
+                    small[section] = data
+                else:
+                    digests[section] = BackupStore.write_blob(data)
+            digests = dict(sorted(digests.items()))
+            packed = BackupStore.write_blob(BackupStore.pack_blob(small)) if small else None
+            scope = sorted(set(scope)) if scope is not None else None
+            
+            latest = BackupStore.latest()
+            if latest:
+                try:
+                    manifest = BackupStore.read_manifest(latest)
+                    if (manifest['sections'] == digests and manifest.get('packed') == packed and
+                            manifest['scope'] == scope):
+                        return latest
+                except (OSError, ValueError, KeyError):
+                    pass
+            
+            now = datetime.datetime.now()
+            manifest_file = BackupStore.MANIFESTS_DIR / f"backup_{now.strftime('%Y%m%d_%H%M%S')}.json"
+            suffix = 1
+            while manifest_file.exists():
+                manifest_file = BackupStore.MANIFESTS_DIR / f"backup_{now.strftime('%Y%m%d_%H%M%S')}_{suffix}.json"
+                suffix += 1
+            
+            created = now.isoformat(timespec='seconds')
+            BackupStore._write_json(manifest_file, {
+                'version': BackupStore.FORMAT_VERSION,
+                'created': created,
+                'scope': scope,
+                'sections': digests,
+                'packed': packed
+            })
+            BackupStore._write_index(BackupStore.entries() + [(manifest_file.name, created, scope is not None)])
+            return manifest_file
+    
+    @staticmethod
+    def load(manifest_file: Path) -> Tuple[Sections, Optional[List[str]]]:
+        """Read a backup back into sections relative to '/', and its scope"""
+        manifest = BackupStore.read_manifest(manifest_file)
+        sections: Sections = {}
+        if manifest.get('packed'):
+            sections.update(DconfKeyfile.parse(BackupStore.read_blob(manifest['packed']).decode('utf-8')))
+        for section, digest in manifest['sections'].items():
+            text = f"[{section}]\n" + BackupStore.read_blob(digest).decode('utf-8')
+            sections.update(DconfKeyfile.parse(text))
+        return sections, manifest['scope']
+    
+    @staticmethod
+    def retained(entries: List[BackupEntry], policy: Dict[str, int]) -> List[BackupEntry]:
+        """Backups kept by the count and age rules of a retention policy
+        
+        Days and weeks count only those that have backups: `keep_daily` keeps
+        the newest backup of each of the last N days on which backups were
+        made, not of the last N calendar days, so a machine that was off for
+        a month still keeps N daily backups.
+        """
+        keep = {entry[0] for entry in entries[-max(policy['keep_last'], 1):]}
+        days: List[datetime.date] = []
+        weeks: List[Tuple[int, int]] = []
+        for name, created, _ in reversed(entries):
+            moment = datetime.datetime.fromisoformat(created)
+            week = tuple(moment.isocalendar()[:2])
+            if moment.date() not in days and len(days) < policy['keep_daily']:
+                days.append(moment.date())
+                keep.add(name)
+            if week not in weeks and len(weeks) < policy['keep_weekly']:
+                weeks.append(week)
+                keep.add(name)
+        return [entry for entry in entries if entry[0] in keep]
+    
+    @staticmethod
+    def prune(policy: Optional[Dict[str, int]] = None, dry_run: bool = False) -> List[str]:
+        """Evict the backups a retention policy doesn't keep, returning their names
+        
+        The store lock is held only while choosing the backups and rewriting
+        the index. Their files are deleted afterwards, so a long prune keeps
+        other users of the store waiting for one batch of blobs at most.
+        """
+        policy = {**BACKUP_RETENTION, **(policy or {})}
+        with BackupStore._locked():
+            entries = BackupStore.entries()
+            kept = BackupStore.retained(entries, policy)
+            
+            references: Dict[str, Set[str]] = {}
+            for name, _, _ in kept:
+                try:
+                    manifest = BackupStore.read_manifest(BackupStore.MANIFESTS_DIR / name)
+                    references[name] = BackupStore.manifest_blobs(manifest)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Evicting unreadable backup {name}: {e}")
+            kept = [entry for entry in kept if entry[0] in references]
+            
+            # Then drop the oldest backups until the blobs they use fit the budget
+            sizes: Dict[str, int] = {}
+            while len(kept) > 1:
+                digests = set().union(*references.values())
+                for digest in digests - sizes.keys():
+                    found = BackupStore.find_blob(digest)
+                    try:
+                        sizes[digest] = found[0].stat().st_size if found else 0
+                    except OSError:
+                        sizes[digest] = 0
+                if sum(sizes[digest] for digest in digests) <= policy['max_bytes']:
+                    break
+                del references[kept.pop(0)[0]]
+            
+            evicted = [name for name, _, _ in entries if name not in references]
+            if dry_run or not evicted:
+                return evicted
+            BackupStore._write_index(kept)
+        
+        # Evicted manifests are no longer listed, so nothing else reads them
+        for name in evicted:
+            try:
+                (BackupStore.MANIFESTS_DIR / name).unlink()
+            except FileNotFoundError:
+                pass
+        BackupStore._collect_garbage(set().union(*references.values()))
+        return evicted
+    
+    @staticmethod
+    def _collect_garbage(referenced: Set[str]):
+        """Delete blobs that no remaining backup references
+        
+        Backups saved since `referenced` was taken refresh the blobs they
+        reuse, so checking a blob's age under the lock keeps it safe.
+        """
+        cutoff = time.time() - BLOB_GRACE_SECONDS
+        try:
+            blob_files = list(BackupStore.OBJECTS_DIR.glob('*/*'))
+        except OSError:
+            return
+        
+        for start in range(0, len(blob_files), BLOB_GC_BATCH_SIZE):
+            with BackupStore._locked():
+                for blob_file in blob_files[start:start + BLOB_GC_BATCH_SIZE]:
+                    digest, _, suffix = blob_file.name.partition('.')
+                    if digest in referenced and suffix != 'tmp':
+                        continue
+                    try:
+                        if blob_file.stat().st_mtime < cutoff:
+                            blob_file.unlink()
+                    except OSError:
+                        pass
+    
+    @staticmethod
+    def prune_in_background(policy: Optional[Dict[str, int]] = None):
+        """Run prune() in a thread at idle priority, unless one is already running"""
+        with BackupStore._lock:
+            if BackupStore._pruning:
+                return
+            BackupStore._pruning = True
+        
+        def run():
+            try:
+                # On Linux this lowers the priority of this thread only
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+            except (AttributeError, OSError):
+                pass
+            
+            try:
+                evicted = BackupStore.prune(policy)
+                if evicted:
+                    print(f"Evicted {len(evicted)} old backups")
+            except Exception as e:
+                print(f"Backup pruning error: {e}")
+            finally:
+                with BackupStore._lock:
+                    BackupStore._pruning = False
+        
+        # A daemon thread, so short-lived processes don't wait for it on exit
+        threading.Thread(target=run, name='backup-prune', daemon=True).start()
@@ -0,0 +1,240 @@
+"""
+Command line interface for the Community Layout Switcher application.
+
+Runs layout, backup and restore operations without loading GTK, so layouts
+can be rolled out from scripts:
+
+    comm-layout-switcher list
+    comm-layout-switcher apply <layout> [--backup | --full-backup]
+    comm-layout-switcher backup [--layout <layout>]
+    comm-layout-switcher restore [file] [--keep-added] [--dry-run]
+    comm-layout-switcher backups [--prune [--keep-last N] [--keep-daily N] [--keep-weekly N] [--max-size MB] [--dry-run]]
+    comm-layout-switcher cleanup [--dry-run]
+    comm-layout-switcher provision <layout> HOME... [--jobs N] [--force]
+    comm-layout-switcher system <layout> [--root DIR] [--name NAME] [--lock]
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from managers import BackupManager
+from dconf_utils import DconfWatcher
+from backup_store import BackupStore
+from layout_catalog import LayoutCatalog
+from layout_engine import LayoutEngine, DconfCleanup
+from provisioning import OfflineProvisioner, SystemDatabase, SYSTEM_DB_ROOT, SYSTEM_DB_NAME
+
+# Subcommands handled here instead of by the GUI
+COMMANDS = ('list', 'apply', 'backup', 'restore', 'backups', 'cleanup', 'provision', 'system')
+
+
+def cmd_list(args) -> int:
+    for layout_name, config_file, _, _ in LayoutCatalog.layouts():
+        config_path = LayoutCatalog.config_path(config_file)
+        print(f"{layout_name}\t{config_path or config_file + ' (missing)'}")
+    return 0
+
+
+def resolve_layout(name: str) -> Optional[Tuple[str, str]]:
+    """Return (layout name, config path) or report why the layout can't be used"""
+    layout = LayoutCatalog.find(name)
+    if not layout:
+        print(f"Unknown layout: {name}", file=sys.stderr)
+        return None
+    
+    layout_name, config_file, _, _ = layout
+    config_path = LayoutCatalog.config_path(config_file)
+    if not config_path:
+        print(f"Config file not found: {config_file}", file=sys.stderr)
+        return None
+    return layout_name, config_path
+
+
+def cmd_apply(args) -> int:
+    layout = resolve_layout(args.layout)
+    if not layout:
+        return 1
+    
+    name, config_path = layout
+    if args.backup or args.full_backup:
+        scope = None if args.full_backup else LayoutEngine.backup_scope(config_path)
+        backup_file = BackupManager.create_backup(scope, background=False)
+        if not backup_file:
+            print("Could not create backup", file=sys.stderr)
+            return 1
+        print(f"Backup created: {backup_file}")
+    
+    started = time.monotonic()
+    with DconfWatcher() as watcher:
+        changes = LayoutEngine.apply_layout(config_path)
+        if args.no_wait:
+            print(f"Applied {name}: {len(changes)} keys written")
+            return 0
+        
+        latency = LayoutEngine.wait_for_changes(changes, started, watcher=watcher)
+    if latency is None:
+        print(f"Applied {name}, but changes did not settle in time", file=sys.stderr)
+        return 1
+    print(f"Applied {name}: {len(changes)} keys written in {latency * 1000:.0f} ms")
+    return 0
+
+
+def cmd_backup(args) -> int:
+    scope = None
+    if args.layout:
+        layout = resolve_layout(args.layout)
+        if not layout:
+            return 1
+        scope = LayoutEngine.backup_scope(layout[1])
+    
+    backup_file = BackupManager.create_backup(scope, background=False)
+    if not backup_file:
+        print("Could not create backup", file=sys.stderr)
+        return 1
+    print(backup_file)
+    return 0
+
+
+def cmd_restore(args) -> int:
+    backup_file = Path(args.file) if args.file else BackupManager.get_latest_backup()
+    if not backup_file or not backup_file.exists():
+        print("No backup found", file=sys.stderr)
+        return 1
+    
+    changes = BackupManager.plan_restore(backup_file, reset_added=not args.keep_added)
+    written = sum(value is not None for value in changes.values())
+    print(f"{backup_file}: {written} keys to write, {len(changes) - written} to reset")
+    if args.dry_run or not changes:
+        return 0
+    
+    if not BackupManager.restore_backup(backup_file, changes):
+        print(f"Could not restore {backup_file}", file=sys.stderr)
+        return 1
+    print(f"Restored {backup_file}")
+    return 0
+
+
+def cmd_backups(args) -> int:
+    if args.prune:
+        policy = {'keep_last': args.keep_last, 'keep_daily': args.keep_daily, 'keep_weekly': args.keep_weekly}
+        if args.max_size is not None:
+            policy['max_bytes'] = args.max_size * 1024 * 1024
+        policy = {key: value for key, value in policy.items() if value is not None}
+        
+        for name in BackupStore.prune(policy, dry_run=args.dry_run):
+            print(f"{'Would remove' if args.dry_run else 'Removed'} {name}")
+    
+    for name, created, scoped in BackupStore.entries():
+        print(f"{created}\t{'scoped' if scoped else 'full'}\t{BackupStore.MANIFESTS_DIR / name}")
+    return 0
+
+
+def cmd_cleanup(args) -> int:
+    subtrees = DconfCleanup.scan()
+    for directory, keys, size in subtrees:
+        print(f"{directory}\t{keys} keys\t{size} bytes")
+    
+    if not subtrees:
+        print("No stray settings found")
+    elif not args.dry_run:
+        print(f"Removed {DconfCleanup.clean(subtrees)} stray keys")
+    return 0
+
+
+def cmd_provision(args) -> int:
+    layout = resolve_layout(args.layout)
+    if not layout:
+        return 1
+    
+    name, config_path = layout
+    changeset = LayoutEngine.read_layout(config_path)
+    results = OfflineProvisioner.provision(args.homes, changeset, jobs=args.jobs, force=args.force)
+    
+    failed = 0
+    for home, ok, message in results:
+        print(f"{home}\t{'ok' if ok else 'FAILED'}\t{message}")
+        failed += not ok
+    print(f"Provisioned {name} into {len(results) - failed} of {len(results)} homes")
+    return 1 if failed else 0
+
+
+def cmd_system(args) -> int:
+    layout = resolve_layout(args.layout)
+    if not layout:
+        return 1
+    
+    name, config_path = layout
+    database = SystemDatabase(args.root, args.name)
+    keys = database.write(LayoutEngine.read_layout(config_path), lock=args.lock)
+    print(f"Wrote {keys} keys{' (locked)' if args.lock else ''} to {database.keyfile}")
+    
+    if not args.no_compile:
+        database.compile()
+        print(f"Compiled {database.database_file}")
+    return 0
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog='comm-layout-switcher',
+        description='Apply desktop layouts and manage settings backups without the GUI.'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    list_parser = subparsers.add_parser('list', help='list available layouts')
+    list_parser.set_defaults(func=cmd_list)
+    
+    apply_parser = subparsers.add_parser('apply', help='apply a layout')
+    apply_parser.add_argument('layout', help='layout name, e.g. "Classic" or "next-gnome"')
+    apply_parser.add_argument('--backup', action='store_true', help="back up the settings the layout touches first")
+    apply_parser.add_argument('--full-backup', action='store_true', help='back up all settings first')
+    apply_parser.add_argument('--no-wait', action='store_true', help="don't wait for the changes to settle")
+    apply_parser.set_defaults(func=cmd_apply)
+    
+    backup_parser = subparsers.add_parser('backup', help='back up the current settings')
+    backup_parser.add_argument('--layout', help='only back up the settings this layout touches')
+    backup_parser.set_defaults(func=cmd_backup)
+    
+    restore_parser = subparsers.add_parser('restore', help='restore a backup (the latest by default)')
+    restore_parser.add_argument('file', nargs='?', help='backup file to restore')
+    restore_parser.add_argument('--keep-added', action='store_true', help="don't reset keys created since the backup")
+    restore_parser.add_argument('--dry-run', action='store_true', help='only report what would change')
+    restore_parser.set_defaults(func=cmd_restore)
+    
+    backups_parser = subparsers.add_parser('backups', help='list backups and evict old ones')
+    backups_parser.add_argument('--prune', action='store_true', help='evict backups the retention policy does not keep')
+    backups_parser.add_argument('--keep-last', type=int, help='keep the N newest backups')
+    backups_parser.add_argument('--keep-daily', type=int, help='keep the newest backup of each of the last N days')
+    backups_parser.add_argument('--keep-weekly', type=int, help='keep the newest backup of each of the last N weeks')
+    backups_parser.add_argument('--max-size', type=int, metavar='MB', help='then evict the oldest backups until the store fits')
+    backups_parser.add_argument('--dry-run', action='store_true', help='only report what would be removed')
+    backups_parser.set_defaults(func=cmd_backups)
+    
+    cleanup_parser = subparsers.add_parser('cleanup', help='remove settings misplaced by older versions')
+    cleanup_parser.add_argument('--dry-run', action='store_true', help='only report what would be removed')
+    cleanup_parser.set_defaults(func=cmd_cleanup)
+    
+    provision_parser = subparsers.add_parser('provision', help="write a layout into logged-out users' databases")
+    provision_parser.add_argument('layout', help='layout name')
+    provision_parser.add_argument('homes', nargs='+', metavar='HOME', help='home directories to provision')
+    provision_parser.add_argument('--jobs', type=int, default=0, help='worker processes (default: one per CPU)')
+    provision_parser.add_argument('--force', action='store_true', help='also provision users that are logged in')
+    provision_parser.set_defaults(func=cmd_provision)
+    
+    system_parser = subparsers.add_parser('system', help='install a layout as the system-wide default')
+    system_parser.add_argument('layout', help='layout name')
+    system_parser.add_argument('--root', default=SYSTEM_DB_ROOT, help=f'dconf database directory (default: {SYSTEM_DB_ROOT})')
+    system_parser.add_argument('--name', default=SYSTEM_DB_NAME, help=f'system database name (default: {SYSTEM_DB_NAME})')
+    system_parser.add_argument('--lock', action='store_true', help="prevent users from changing the layout's keys")
+    system_parser.add_argument('--no-compile', action='store_true', help="only write the keyfile, don't run dconf compile")
+    system_parser.set_defaults(func=cmd_system)
+    
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
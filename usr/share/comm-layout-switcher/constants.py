@@ -2,15 +2,76 @@
 Constants and global variables for the Community Layout Switcher application.
 """
 
+import os
 from pathlib import Path
 
 # Application constants
 APP_ID = 'org.bigappearance.app'
 CONFIG_DIR = Path.home() / '.config' / 'big-appearance'
 BACKUP_DIR = CONFIG_DIR / 'backups'
+CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'comm-layout-switcher'
+LAYOUT_CACHE_DIR = CACHE_DIR / 'layouts'
+THUMBNAIL_CACHE_DIR = CACHE_DIR / 'thumbnails'
+CATALOG_CACHE_FILE = CACHE_DIR / 'catalog.json'
 LAYOUTS_DIR = 'layouts'
 ICONS_DIR = 'icons'
+RESOURCE_BUNDLE = 'resources.bundle'
 SETTINGS_FILE = CONFIG_DIR / 'settings.json'
+JOURNAL_FILE = CONFIG_DIR / 'journal.json'
+
+# Pixel sizes of the layout thumbnails in the sidebar and the preview card,
+# rendered at twice the on-screen size so they stay sharp on HiDPI screens
+ROW_THUMBNAIL_SIZE = (80, 80)
+PREVIEW_THUMBNAIL_SIZE = (660, 320)
+
+# Largest size, in pixels, at which vector images are preferred over raster ones
+VECTOR_MAX_SIZE = 128
+
+# Memory budget for decoded textures shared by all views
+TEXTURE_CACHE_BYTES = 32 * 1024 * 1024
+
+# Backups kept after each new backup: the newest `keep_last`, the newest of
+# each of the last `keep_daily` days and `keep_weekly` weeks that have
+# backups, then trimmed from the oldest until the store fits in `max_bytes`
+BACKUP_RETENTION = {
+    'keep_last': 10,
+    'keep_daily': 7,
+    'keep_weekly': 4,
+    'max_bytes': 64 * 1024 * 1024,
+}
+
+# Compression of backup blobs: 'xz' (smallest), 'gzip' (fastest) or None
+BACKUP_COMPRESSION = 'xz'
+
+# Seconds before a tested layout is reverted automatically (0 disables it)
+TEST_REVERT_SECONDS = 20
+
+# dconf directories whose settings make up a desktop layout. Wallpapers are
+# left out: they point at per-machine files and are the user's own choice
+LAYOUT_ALLOWED_PATHS = (
+    '/org/gnome/shell/',
+    '/org/gnome/mutter/',
+    '/org/gnome/desktop/wm/preferences/',
+    '/org/gnome/desktop/app-folders/',
+)
+
+# Keys saved by every scoped backup in addition to the layout's directories
+BACKUP_EXTRA_KEYS = (
+    '/org/gnome/shell/enabled-extensions',
+    '/org/gnome/shell/disabled-extensions',
+)
+
+# Personal, per-machine or window-state settings below the allowed directories
+LAYOUT_DENIED_PATHS = (
+    '/org/gnome/shell/command-history',
+    '/org/gnome/shell/welcome-dialog-last-shown-version',
+    '/org/gnome/shell/last-selected-power-profile',
+    '/org/gnome/shell/remember-mount-password',
+    '/org/gnome/shell/extensions/gsconnect/',
+    '/org/gnome/shell/extensions/arcmenu/recently-installed-apps',
+    '/org/gnome/shell/extensions/arcmenu/prefs-visible-page',
+    '/org/gnome/shell/extensions/arcmenu/update-notifier-project-version',
+)
 
 # Theme color mapping
 COLOR_MAP = {
@@ -52,6 +113,14 @@ EXTENSIONS = [
     }
 ]
 
+# Directories searched for drop-in layouts, in order of precedence
+LAYOUT_DROPIN_DIRS = [
+    Path.home() / '.local/share/comm-layout-switcher/layouts',
+    Path('/etc/comm-layout-switcher/layouts'),
+    Path('/usr/local/share/comm-layout-switcher/layouts'),
+    Path('/usr/share/comm-layout-switcher/layouts'),
+]
+
 # Layout definitions
 LAYOUTS = [
     ("Classic", "classic.txt", "classic.svg", "view-continuous-symbolic"),
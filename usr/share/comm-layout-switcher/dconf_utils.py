@@ -0,0 +1,332 @@
+"""
+dconf helpers for the Community Layout Switcher application.
+"""
+
+import re
+import time
+import subprocess
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from gi.repository import GLib, Gio
+except (ImportError, ValueError):
+    GLib = None
+    Gio = None
+
+
+# Sections map a dconf directory (relative to a load root) to its keys,
+# and each key to its value in GVariant text format, exactly as found
+# in the output of `dconf dump`.
+Sections = Dict[str, Dict[str, str]]
+
+# A changeset maps absolute dconf paths to GVariant text values. A value
+# of None resets the key (or the whole directory, for paths ending in '/').
+Changeset = Dict[str, Optional[str]]
+
+_SECTION_RE = re.compile(r'^\[(.*)\]$')
+
+
+class DconfKeyfile:
+    """Parses and writes the keyfile format used by `dconf dump`/`dconf load`"""
+    
+    @staticmethod
+    def iter_sections(lines: Iterable[str]) -> Iterator[Tuple[str, Dict[str, str]]]:
+        """Parse keyfile lines, yielding each section as soon as it is complete"""
+        name = None
+        keys: Dict[str, str] = {}
+        
+        for raw_line in lines:
+            line = raw_line.strip()
+            if not line or line.startswith('#'):
+                continue
+            
+            match = _SECTION_RE.match(line)
+            if match:
+                if name is not None:
+                    yield name, keys
+                name, keys = match.group(1), {}
+                continue
+            
+            if name is None or '=' not in line:
+                continue
+            
+            key, value = line.split('=', 1)
+            keys[key.strip()] = value.strip()
+        
+        if name is not None:
+            yield name, keys
+    
+    @staticmethod
+    def parse(text: str) -> Sections:
+        """Parse keyfile text into sections"""
+        sections: Sections = {}
+        for name, keys in DconfKeyfile.iter_sections(text.splitlines()):
+            sections.setdefault(name, {}).update(keys)
+        return sections
+    
+    @staticmethod
+    def serialize(sections: Sections) -> str:
+        """Serialize sections back into keyfile text"""
+        blocks = []
+        for section, keys in sections.items():
+            if not keys:
+                continue
+            lines = [f"[{section}]"]
+            lines.extend(f"{key}={value}" for key, value in keys.items())
+            blocks.append("\n".join(lines))
+        
+        return "\n\n".join(blocks) + "\n" if blocks else ""
+    
+    @staticmethod
+    def section_to_dir(root: str, section: str) -> str:
+        """Turn a section name into an absolute dconf directory"""
+        section = section.strip('/')
+        if not section:
+            return root
+        return f"{root.rstrip('/')}/{section}/"
+    
+    @staticmethod
+    def to_changeset(root: str, sections: Sections) -> Changeset:
+        """Flatten sections loaded at `root` into absolute key paths"""
+        changeset: Changeset = {}
+        for section, keys in sections.items():
+            directory = DconfKeyfile.section_to_dir(root, section)
+            for key, value in keys.items():
+                changeset[directory + key] = value
+        return changeset
+    
+    @staticmethod
+    def from_changeset(changeset: Changeset) -> Sections:
+        """Group the writes of a changeset into sections relative to '/'"""
+        sections: Sections = {}
+        for path, value in changeset.items():
+            if value is None or path.endswith('/'):
+                continue
+            directory, key = path.rsplit('/', 1)
+            sections.setdefault(directory.strip('/') or '/', {})[key] = value
+        return sections
+    
+    @staticmethod
+    def quote_string(text: str) -> str:
+        """Format a Python string as a GVariant string literal"""
+        escaped = text.replace('\\', '\\\\').replace("'", "\\'")
+        return f"'{escaped}'"
+    
+    @staticmethod
+    def normalize_value(value: str) -> str:
+        """Return a canonical text form of a GVariant value for comparison"""
+        value = value.strip()
+        if GLib is not None:
+            try:
+                return GLib.Variant.parse(None, value, None, None).print_(True)
+            except Exception:
+                pass
+        return value
+
+
+# dconf writer service on the session bus
+DCONF_BUS_NAME = 'ca.desrt.dconf'
+DCONF_WRITER_PATH = '/ca/desrt/dconf/Writer/user'
+DCONF_WRITER_INTERFACE = 'ca.desrt.dconf.Writer'
+
+
+class DconfClient:
+    """Thin wrapper around the `dconf` command line tool"""
+    
+    @staticmethod
+    def dump(directory: str) -> Sections:
+        """Read a dconf directory recursively"""
+        result = subprocess.run(
+            ["dconf", "dump", directory],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=10
+        )
+        return DconfKeyfile.parse(result.stdout)
+    
+    @staticmethod
+    def iter_dump(directory: str) -> Iterator[Tuple[str, Dict[str, str]]]:
+        """Read a dconf directory recursively, yielding sections while `dconf dump` prints them"""
+        with subprocess.Popen(["dconf", "dump", directory], stdout=subprocess.PIPE, text=True) as process:
+            try:
+                yield from DconfKeyfile.iter_sections(process.stdout)
+            except BaseException:
+                process.kill()
+                raise
+            if process.wait(timeout=10):
+                raise subprocess.CalledProcessError(process.returncode, process.args)
+    
+    @staticmethod
+    def load(directory: str, sections: Sections):
+        """Write sections below a dconf directory in a single changeset"""
+        subprocess.run(
+            ["dconf", "load", directory],
+            input=DconfKeyfile.serialize(sections),
+            text=True,
+            check=True,
+            timeout=10
+        )
+    
+    @staticmethod
+    def read(path: str) -> Optional[str]:
+        """Read a single key, returning None if it is unset"""
+        result = subprocess.run(
+            ["dconf", "read", path],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=10
+        )
+        value = result.stdout.strip()
+        return value or None
+    
+    @staticmethod
+    def reset(path: str):
+        """Reset a key, or a whole directory if the path ends in '/'"""
+        args = ["dconf", "reset"]
+        if path.endswith('/'):
+            args.append("-f")
+        subprocess.run(args + [path], check=True, timeout=10)
+
+
+class DconfWriter:
+    """Submits changesets to dconf as a single atomic change"""
+    
+    @staticmethod
+    def write(changeset: Changeset):
+        """Write a changeset, over D-Bus when possible and through `dconf` otherwise"""
+        if not changeset:
+            return
+        
+        if Gio is not None:
+            try:
+                DconfWriter._write_dbus(changeset)
+                return
+            except Exception as e:
+                print(f"dconf D-Bus write failed, falling back to dconf: {e}")
+        
+        DconfWriter._write_subprocess(changeset)
+    
+    @staticmethod
+    def _write_dbus(changeset: Changeset):
+        """Send the changeset to the dconf writer service in one Change call"""
+        entries = {}
+        for path, value in changeset.items():
+            entries[path] = None if value is None else GLib.Variant.parse(None, value, None, None)
+        
+        # The writer expects the serialised a{smv} changeset as a byte array
+        serialised = GLib.Variant('a{smv}', entries)
+        blob = GLib.Variant.new_from_bytes(GLib.VariantType('ay'), serialised.get_data_as_bytes(), True)
+        
+        connection = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+        connection.call_sync(
+            DCONF_BUS_NAME,
+            DCONF_WRITER_PATH,
+            DCONF_WRITER_INTERFACE,
+            'Change',
+            GLib.Variant.new_tuple(blob),
+            GLib.VariantType('(s)'),
+            Gio.DBusCallFlags.NONE,
+            10000,
+            None
+        )
+    
+    @staticmethod
+    def _write_subprocess(changeset: Changeset):
+        """Fallback: resets via `dconf reset`, writes via one `dconf load`"""
+        for path, value in changeset.items():
+            if value is None:
+                DconfClient.reset(path)
+        
+        sections = DconfKeyfile.from_changeset(changeset)
+        if sections:
+            DconfClient.load('/', sections)
+
+
+class DconfWatcher:
+    """Collects the paths that dconf reports as changed
+    
+    Use as a context manager around both the write and the wait, so no
+    notification is missed. Without Gio or a session bus, the watcher is
+    not `active` and wait() simply sleeps for the requested time.
+    """
+    
+    def __init__(self):
+        self.touched: List[str] = []
+        self.context = None
+        self.connection = None
+        self.subscription = None
+    
+    def __enter__(self):
+        if Gio is None:
+            return self
+        
+        try:
+            # Dispatch the signal to this thread rather than the GTK main loop
+            self.context = GLib.MainContext.new()
+            self.context.push_thread_default()
+            self.connection = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+            self.subscription = self.connection.signal_subscribe(
+                None,
+                DCONF_WRITER_INTERFACE,
+                'Notify',
+                DCONF_WRITER_PATH,
+                None,
+                Gio.DBusSignalFlags.NONE,
+                self._on_notify
+            )
+        except Exception as e:
+            print(f"Could not watch dconf changes: {e}")
+            self._release()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._release()
+        return False
+    
+    @property
+    def active(self) -> bool:
+        """Whether change notifications are being received"""
+        return self.subscription is not None
+    
+    @staticmethod
+    def covers(path: str, touched: Iterable[str]) -> bool:
+        """Check whether a key is one of the touched keys or below a touched directory"""
+        return any(path == item or (item.endswith('/') and path.startswith(item)) for item in touched)
+    
+    def _release(self):
+        """Drop the signal subscription and the private main context"""
+        if self.subscription is not None:
+            self.connection.signal_unsubscribe(self.subscription)
+            self.subscription = None
+        if self.context is not None:
+            self.context.pop_thread_default()
+            self.context = None
+    
+    def _on_notify(self, connection, sender, path, interface, signal, parameters):
+        """Handle ca.desrt.dconf.Writer.Notify(prefix, changes, tag)"""
+        prefix, changes, _ = parameters.unpack()
+        self.touched.extend([prefix + change for change in changes] or [prefix])
+    
+    def wait(self, timeout: float) -> List[str]:
+        """Wait up to `timeout` seconds for notifications and return the paths they touched"""
+        if not self.active:
+            time.sleep(timeout)
+            return []
+        
+        expired = []
+        source = GLib.timeout_source_new(max(1, int(timeout * 1000)))
+        source.set_callback(lambda *args: expired.append(True) or False)
+        source.attach(self.context)
+        try:
+            # Deliver notifications queued during the write before blocking
+            while self.context.pending():
+                self.context.iteration(False)
+            while not self.touched and not expired:
+                self.context.iteration(True)
+        finally:
+            source.destroy()
+        
+        touched, self.touched = self.touched, []
+        return touched
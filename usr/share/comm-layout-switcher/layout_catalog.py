@@ -0,0 +1,158 @@
+"""
+Layout catalog for the Community Layout Switcher application.
+
+Besides the built-in layouts, layouts are discovered in drop-in directories.
+A drop-in layout is a layout file plus a JSON sidecar with the same name:
+
+    ~/.local/share/comm-layout-switcher/layouts/office.txt
+    ~/.local/share/comm-layout-switcher/layouts/office.json
+
+    {"name": "Office", "icon": "office.svg", "fallback_icon": "view-grid-symbolic"}
+
+Files without a sidecar, such as shared base layouts, are not listed.
+"""
+
+import os
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from constants import LAYOUTS, LAYOUTS_DIR, LAYOUT_DROPIN_DIRS, CATALOG_CACHE_FILE
+from managers import SystemUtils
+
+# (name, layout file name or absolute path, icon file name or absolute path, fallback icon name)
+LayoutEntry = Tuple[str, str, str, str]
+
+# Sidecar values used when a key is missing
+DEFAULT_FALLBACK_ICON = 'view-grid-symbolic'
+
+
+class LayoutCatalog:
+    """Lists the built-in and drop-in layouts, caching the drop-in scan between runs"""
+    
+    # Bump whenever the sidecar format or the stored index changes
+    FORMAT_VERSION = 1
+    
+    _entries: Optional[List[LayoutEntry]] = None
+    
+    @staticmethod
+    def _mtime(path: Path) -> Optional[int]:
+        """Modification time of a file or directory, or None if it doesn't exist"""
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+    
+    @staticmethod
+    def read_sidecar(sidecar: Path) -> Optional[LayoutEntry]:
+        """Build a catalog entry from a sidecar and the layout file next to it"""
+        try:
+            with open(sidecar, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring layout metadata {sidecar}: {e}")
+            return None
+        if not isinstance(meta, dict):
+            return None
+        
+        config_path = sidecar.parent / meta.get('file', sidecar.stem + '.txt')
+        if not config_path.is_file():
+            print(f"Ignoring layout metadata {sidecar}: {config_path.name} not found")
+            return None
+        
+        # Icons next to the sidecar are used by path, anything else by name
+        icon = meta.get('icon', sidecar.stem + '.svg')
+        if (sidecar.parent / icon).exists():
+            icon = str(sidecar.parent / icon)
+        
+        name = meta.get('name') or sidecar.stem.replace('-', ' ').title()
+        return name, str(config_path), icon, meta.get('fallback_icon', DEFAULT_FALLBACK_ICON)
+    
+    @staticmethod
+    def scan() -> Tuple[List[Tuple[str, Optional[int]]], List[LayoutEntry]]:
+        """Read every sidecar; returns the stamps that validate the result and the entries"""
+        stamps = []
+        entries = []
+        for directory in LAYOUT_DROPIN_DIRS:
+            stamps.append((str(directory), LayoutCatalog._mtime(directory)))
+            try:
+                sidecars = sorted(directory.glob('*.json'))
+            except OSError:
+                continue
+            
+            for sidecar in sidecars:
+                stamps.append((str(sidecar), LayoutCatalog._mtime(sidecar)))
+                entry = LayoutCatalog.read_sidecar(sidecar)
+                if entry:
+                    entries.append(entry)
+        return stamps, entries
+    
+    @staticmethod
+    def _read_cache() -> Optional[List[LayoutEntry]]:
+        """Return the cached drop-in entries if no directory or sidecar changed"""
+        try:
+            with open(CATALOG_CACHE_FILE, 'r') as f:
+                stored = json.load(f)
+            if stored.get('version') != LayoutCatalog.FORMAT_VERSION:
+                return None
+            if any(LayoutCatalog._mtime(Path(path)) != mtime for path, mtime in stored['stamps']):
+                return None
+            return [tuple(entry) for entry in stored['layouts']]
+        except (OSError, ValueError, KeyError, AttributeError, TypeError):
+            return None
+    
+    @staticmethod
+    def _write_cache(stamps: List[Tuple[str, Optional[int]]], entries: List[LayoutEntry]):
+        """Store the drop-in entries atomically"""
+        try:
+            CATALOG_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = CATALOG_CACHE_FILE.with_suffix('.tmp')
+            with open(temp_file, 'w') as f:
+                json.dump({'version': LayoutCatalog.FORMAT_VERSION, 'stamps': stamps, 'layouts': entries}, f)
+            os.replace(temp_file, CATALOG_CACHE_FILE)
+        except OSError as e:
+            print(f"Could not cache layout catalog: {e}")
+    
+    @staticmethod
+    def layouts() -> List[LayoutEntry]:
+        """Return all layouts; drop-ins come first and replace built-ins of the same name"""
+        if LayoutCatalog._entries is not None:
+            return LayoutCatalog._entries
+        
+        dropins = LayoutCatalog._read_cache()
+        if dropins is None:
+            stamps, dropins = LayoutCatalog.scan()
+            LayoutCatalog._write_cache(stamps, dropins)
+        
+        entries = []
+        seen = set()
+        for entry in dropins + list(LAYOUTS):
+            if entry[0].lower() not in seen:
+                seen.add(entry[0].lower())
+                entries.append(entry)
+        
+        LayoutCatalog._entries = entries
+        return entries
+    
+    @staticmethod
+    def reload():
+        """Forget the layouts listed so far, e.g. after adding drop-ins"""
+        LayoutCatalog._entries = None
+    
+    @staticmethod
+    def find(name: str) -> Optional[LayoutEntry]:
+        """Look up a layout by display name or file name, ignoring case"""
+        wanted = name.lower()
+        for entry in LayoutCatalog.layouts():
+            file_name = os.path.basename(entry[1])
+            stem = file_name.rsplit('.', 1)[0]
+            if wanted in (entry[0].lower(), file_name.lower(), stem.lower()):
+                return entry
+        return None
+    
+    @staticmethod
+    def config_path(config_file: str) -> Optional[str]:
+        """Locate the layout file of an entry"""
+        if os.path.isabs(config_file):
+            return config_file if os.path.exists(config_file) else None
+        return SystemUtils.find_file(config_file, [LAYOUTS_DIR])
@@ -0,0 +1,387 @@
+"""
+Layout application engine for the Community Layout Switcher application.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import contextlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from constants import LAYOUT_CACHE_DIR, JOURNAL_FILE, BACKUP_EXTRA_KEYS
+from dconf_utils import DconfKeyfile, DconfClient, DconfWriter, DconfWatcher, Changeset, Sections
+from layout_sanitizer import LayoutSanitizer
+from managers import SystemUtils
+from resource_bundle import ResourceBundle
+
+# Directory that shell-relative layout sections (e.g. [extensions/arcmenu]) belong to
+LAYOUT_ROOT = '/org/gnome/shell/'
+
+# First path components of sections that already name an absolute dconf path
+ABSOLUTE_SECTION_ROOTS = ('org', 'com', 'ca', 'net', 'io')
+
+# Seconds to wait for written keys to read back with their new values
+SETTLE_TIMEOUT = 5.0
+
+# Matched against raw layout bytes: the first non-blank line of an overlay
+_BASE_DIRECTIVE_RE = re.compile(rb'\A\s*#[ \t]*base:[ \t]*(\S+)[ \t]*$', re.MULTILINE)
+
+
+class LayoutEngine:
+    """Applies layouts by writing only the keys that differ from the current state"""
+    
+    @staticmethod
+    def is_absolute_section(section: str) -> bool:
+        """Check whether a layout section names an absolute dconf path"""
+        return section.strip('/').split('/', 1)[0] in ABSOLUTE_SECTION_ROOTS
+    
+    @staticmethod
+    def route_section(section: str) -> Optional[str]:
+        """Return the absolute dconf directory a layout section belongs to, or None"""
+        stripped = section.strip('/')
+        if '//' in stripped or any(c.isspace() for c in stripped):
+            return None
+        
+        if LayoutEngine.is_absolute_section(stripped):
+            return DconfKeyfile.section_to_dir('/', stripped)
+        return DconfKeyfile.section_to_dir(LAYOUT_ROOT, stripped)
+    
+    @staticmethod
+    def route_sections(sections: Sections) -> Changeset:
+        """Flatten layout sections into absolute key paths
+        
+        Shell-relative sections are what older versions actually applied,
+        so they take precedence over absolute sections naming the same key.
+        """
+        absolute: Changeset = {}
+        relative: Changeset = {}
+        
+        for section, keys in sections.items():
+            directory = LayoutEngine.route_section(section)
+            if directory is None:
+                print(f"Skipping layout section that cannot be mapped: [{section}]")
+                continue
+            
+            target = absolute if LayoutEngine.is_absolute_section(section) else relative
+            for key, value in keys.items():
+                if '/' in key:
+                    continue
+                target[directory + key] = value
+        
+        absolute.update(relative)
+        return absolute
+    
+    @staticmethod
+    def read_layout(config_path: str) -> Changeset:
+        """Read a layout file into a changeset of absolute key paths"""
+        return LayoutCompiler.load(config_path)
+    
+    @staticmethod
+    def backup_scope(config_path: str) -> List[str]:
+        """Directories a layout writes to, plus the extension list, for a scoped backup"""
+        directories = {path.rsplit('/', 1)[0] + '/' for path in LayoutEngine.read_layout(config_path)}
+        return sorted(directories) + list(BACKUP_EXTRA_KEYS)
+    
+    @staticmethod
+    def read_keys(paths: Iterable[str]) -> Dict[str, str]:
+        """Read the current values of some keys, dumping only the directories that hold them"""
+        paths = set(paths)
+        roots: List[str] = []
+        for directory in sorted({path.rsplit('/', 1)[0] + '/' for path in paths}):
+            if not any(directory.startswith(root) for root in roots):
+                roots.append(directory)
+        
+        values = {}
+        for root in roots:
+            for path, value in DconfKeyfile.to_changeset(root, DconfClient.dump(root)).items():
+                if path in paths:
+                    values[path] = value
+        return values
+    
+    @staticmethod
+    def compute_changes(target: Changeset, current: Dict[str, str]) -> Changeset:
+        """Return the part of `target` that differs from `current`"""
+        changes: Changeset = {}
+        for path, value in target.items():
+            current_value = current.get(path)
+            if current_value is not None and (
+                current_value == value or
+                DconfKeyfile.normalize_value(current_value) == DconfKeyfile.normalize_value(value)
+            ):
+                continue
+            changes[path] = value
+        return changes
+    
+    @staticmethod
+    def write_changes(changes: Changeset):
+        """Submit a changeset to dconf"""
+        DconfWriter.write(changes)
+    
+    @staticmethod
+    def apply_layout(config_path: str, current: Optional[Dict[str, str]] = None) -> Changeset:
+        """Apply a layout file, writing only changed keys, and return what was written"""
+        target = LayoutEngine.read_layout(config_path)
+        if current is None:
+            current = LayoutEngine.read_keys(target)
+        
+        changes = LayoutEngine.compute_changes(target, current)
+        print(f"Layout {config_path}: {len(changes)} of {len(target)} keys changed")
+        
+        LayoutJournal.record(changes, current)
+        LayoutEngine.write_changes(changes)
+        return changes
+    
+    @staticmethod
+    def wait_for_changes(changes: Changeset, started: float, timeout: float = SETTLE_TIMEOUT,
+                         watcher: Optional[DconfWatcher] = None) -> Optional[float]:
+        """Wait until dconf reports the written keys as changed
+        
+        `watcher` should have been entered before the write; keys are then
+        settled by the writer's notifications alone. Without one, or without
+        a session bus, the keys still pending are read back instead.
+        Returns the latency in seconds since `started` (a time.monotonic()
+        value), or None if the keys did not settle before the deadline.
+        """
+        pending = {path: value for path, value in changes.items() if value is not None}
+        if not pending:
+            return time.monotonic() - started
+        
+        deadline = started + timeout
+        delay = 0.02
+        
+        with contextlib.ExitStack() as stack:
+            # A watcher entered after the write has missed its notifications
+            late = watcher is None
+            if late:
+                watcher = stack.enter_context(DconfWatcher())
+            if late or not watcher.active:
+                pending = LayoutEngine.compute_changes(pending, LayoutEngine.read_keys(pending))
+            
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                
+                if watcher.active:
+                    touched = watcher.wait(remaining)
+                    pending = {
+                        path: value for path, value in pending.items()
+                        if not DconfWatcher.covers(path, touched)
+                    }
+                else:
+                    watcher.wait(min(delay, remaining))
+                    delay = min(delay * 2, 0.5)
+                    pending = LayoutEngine.compute_changes(pending, LayoutEngine.read_keys(pending))
+        
+        return time.monotonic() - started
+
+
+class LayoutJournal:
+    """Remembers the previous values of the keys changed by the last apply"""
+    
+    @staticmethod
+    def record(changes: Changeset, current: Dict[str, str]) -> Changeset:
+        """Store the pre-image of a changeset; keys that were unset are stored as None"""
+        preimage = {path: current.get(path) for path in changes}
+        try:
+            JOURNAL_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(JOURNAL_FILE, 'w') as f:
+                json.dump(preimage, f)
+        except OSError as e:
+            print(f"Could not write layout journal: {e}")
+        return preimage
+    
+    @staticmethod
+    def load() -> Optional[Changeset]:
+        """Return the recorded pre-image, or None if there is nothing to revert"""
+        try:
+            with open(JOURNAL_FILE, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def clear():
+        """Forget the recorded pre-image"""
+        try:
+            JOURNAL_FILE.unlink()
+        except FileNotFoundError:
+            pass
+    
+    @staticmethod
+    def revert() -> Optional[int]:
+        """Write the recorded pre-image back in one change and return the number of keys"""
+        preimage = LayoutJournal.load()
+        if preimage is None:
+            return None
+        
+        DconfWriter.write(preimage)
+        LayoutJournal.clear()
+        return len(preimage)
+
+
+class LayoutCompiler:
+    """Caches parsed, routed and normalized layouts keyed by file and sanitizer hashes
+    
+    A layout file may start with a `# base: <file>` line, in which case it is
+    an overlay whose keys are applied on top of the named base layout.
+    """
+    
+    # Bump whenever parsing, routing or the stored format changes
+    FORMAT_VERSION = 3
+    
+    # config_path -> ([(path, mtime_ns, size), ...], changeset)
+    _memory: Dict[str, Tuple[List[Tuple[str, int, int]], Changeset]] = {}
+    
+    @staticmethod
+    def base_of(data) -> Optional[str]:
+        """Return the base layout named by an overlay, if any, reading a bytes-like object in place"""
+        match = _BASE_DIRECTIVE_RE.match(data)
+        return str(match.group(1), 'utf-8') if match else None
+    
+    @staticmethod
+    def read_layers(config_path: str) -> List[Tuple[str, bytes]]:
+        """Read a layout and its bases, outermost base first; data may be a bundle slice"""
+        layers = []
+        path = config_path
+        while path:
+            if any(path == seen for seen, _ in layers):
+                raise ValueError(f"Layout base cycle at {path}")
+            data = ResourceBundle.read(path)
+            layers.insert(0, (path, data))
+            
+            base = LayoutCompiler.base_of(data)
+            if not base:
+                break
+            sibling = os.path.join(os.path.dirname(path), base)
+            path = sibling if os.path.exists(sibling) else SystemUtils.find_file(base, ['layouts'])
+            if not path:
+                raise FileNotFoundError(f"Base layout not found: {base}")
+        return layers
+    
+    @staticmethod
+    def compile(texts: List[str]) -> Sections:
+        """Compile layout layers into absolute directories mapped to normalized values"""
+        changeset: Changeset = {}
+        for text in texts:
+            changeset.update(LayoutEngine.route_sections(DconfKeyfile.parse(text)))
+        
+        compiled: Sections = {}
+        for path, value in LayoutSanitizer.sanitize(changeset).items():
+            directory, key = path.rsplit('/', 1)
+            compiled.setdefault(directory + '/', {})[key] = DconfKeyfile.normalize_value(value)
+        return compiled
+    
+    @staticmethod
+    def cache_file(digest: str) -> Path:
+        """Location of the compiled form of a layout with the given content hash"""
+        return LAYOUT_CACHE_DIR / f"{digest}.json"
+    
+    @staticmethod
+    def load(config_path: str) -> Changeset:
+        """Return the changeset of a layout file, compiling it only when it changed"""
+        cached = LayoutCompiler._memory.get(config_path)
+        if cached and LayoutCompiler._unchanged(cached[0]):
+            return dict(cached[1])
+        
+        layers = LayoutCompiler.read_layers(config_path)
+        # Sanitizing is part of compiling, so its configuration is part of the key
+        digest = hashlib.sha256(LayoutSanitizer.fingerprint())
+        for _, data in layers:
+            digest.update(hashlib.sha256(data).digest())
+        cache_file = LayoutCompiler.cache_file(digest.hexdigest())
+        
+        compiled = LayoutCompiler._read_cache(cache_file)
+        if compiled is None:
+            # Decoding copies the text, so it only happens when compiling
+            compiled = LayoutCompiler.compile([str(data, 'utf-8') for _, data in layers])
+            LayoutCompiler._write_cache(cache_file, compiled)
+        
+        changeset = {
+            directory + key: value
+            for directory, keys in compiled.items()
+            for key, value in keys.items()
+        }
+        stats = [(path, *ResourceBundle.stat(path)) for path, _ in layers]
+        LayoutCompiler._memory[config_path] = (stats, changeset)
+        return dict(changeset)
+    
+    @staticmethod
+    def _unchanged(stats: List[Tuple[str, int, int]]) -> bool:
+        """Check that none of the files a layout was compiled from changed"""
+        try:
+            for path, mtime_ns, size in stats:
+                if ResourceBundle.stat(path) != (mtime_ns, size):
+                    return False
+        except OSError:
+            return False
+        return True
+    
+    @staticmethod
+    def _read_cache(cache_file: Path) -> Optional[Sections]:
+        """Read a compiled layout, ignoring missing, corrupt or outdated entries"""
+        try:
+            with open(cache_file, 'r') as f:
+                stored = json.load(f)
+            if stored.get('version') == LayoutCompiler.FORMAT_VERSION:
+                return stored['sections']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+        return None
+    
+    @staticmethod
+    def _write_cache(cache_file: Path, compiled: Sections):
+        """Store a compiled layout atomically"""
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = cache_file.with_suffix('.tmp')
+            with open(temp_file, 'w') as f:
+                json.dump({'version': LayoutCompiler.FORMAT_VERSION, 'sections': compiled}, f)
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            print(f"Could not cache compiled layout: {e}")
+
+
+class DconfCleanup:
+    """Finds and removes settings that older releases wrote below the wrong prefix
+    
+    Older releases loaded whole layouts under LAYOUT_ROOT, so their absolute
+    sections ended up in trees like /org/gnome/shell/org/gnome/... No shell
+    setting lives below a reverse-DNS root, so any such tree is garbage.
+    """
+    
+    @staticmethod
+    def misplaced_directory(path: str) -> Optional[str]:
+        """Return the misplaced vendor directory (e.g. /org/gnome/shell/org/gnome/) holding a key"""
+        if not path.startswith(LAYOUT_ROOT):
+            return None
+        
+        components = path[len(LAYOUT_ROOT):].split('/')[:-1]
+        if not components or components[0] not in ABSOLUTE_SECTION_ROOTS:
+            return None
+        return LAYOUT_ROOT + '/'.join(components[:2]) + '/'
+    
+    @staticmethod
+    def scan() -> List[Tuple[str, int, int]]:
+        """Return (directory, key count, size in bytes) for each misplaced subtree found"""
+        current = DconfKeyfile.to_changeset(LAYOUT_ROOT, DconfClient.dump(LAYOUT_ROOT))
+        
+        found: Dict[str, List[int]] = {}
+        for path, value in current.items():
+            directory = DconfCleanup.misplaced_directory(path)
+            if directory is None:
+                continue
+            stats = found.setdefault(directory, [0, 0])
+            stats[0] += 1
+            stats[1] += len(f"{path.rsplit('/', 1)[1]}={value}\n".encode('utf-8'))
+        
+        return sorted((directory, keys, size) for directory, (keys, size) in found.items())
+    
+    @staticmethod
+    def clean(subtrees: List[Tuple[str, int, int]]) -> int:
+        """Reset the given subtrees in a single change and return the number of keys removed"""
+        DconfWriter.write({directory: None for directory, _, _ in subtrees})
+        return sum(keys for _, keys, _ in subtrees)
@@ -0,0 +1,128 @@
+"""
+Layout sanitizer for the Community Layout Switcher application.
+
+Can also be run as a tool to write a minimal copy of a layout file, or to
+rewrite a family of layouts as one shared base plus a small overlay each:
+
+    python3 layout_sanitizer.py INPUT [OUTPUT]
+    python3 layout_sanitizer.py --split BASE LAYOUT...
+"""
+
+import os
+import sys
+import json
+import hashlib
+from typing import Dict, List, Tuple
+
+from constants import LAYOUT_ALLOWED_PATHS, LAYOUT_DENIED_PATHS
+from dconf_utils import DconfKeyfile, Changeset
+
+
+class LayoutSanitizer:
+    """Keeps only the settings that belong to a desktop layout"""
+    
+    @staticmethod
+    def is_allowed(path: str) -> bool:
+        """Check whether an absolute key path is part of a layout"""
+        if not path.startswith(LAYOUT_ALLOWED_PATHS):
+            return False
+        return not any(
+            path == denied or (denied.endswith('/') and path.startswith(denied))
+            for denied in LAYOUT_DENIED_PATHS
+        )
+    
+    @staticmethod
+    def fingerprint() -> bytes:
+        """Hash of the allowed and denied paths, for caches of sanitized output"""
+        config = json.dumps([LAYOUT_ALLOWED_PATHS, LAYOUT_DENIED_PATHS])
+        return hashlib.sha256(config.encode('utf-8')).digest()
+    
+    @staticmethod
+    def sanitize(changeset: Changeset) -> Changeset:
+        """Drop every key that is not part of a layout"""
+        return {path: value for path, value in changeset.items() if LayoutSanitizer.is_allowed(path)}
+    
+    @staticmethod
+    def to_keyfile(changeset: Changeset) -> str:
+        """Write a changeset as a layout file with absolute sections"""
+        sections = DconfKeyfile.from_changeset(changeset)
+        return DconfKeyfile.serialize({
+            section: dict(sorted(keys.items())) for section, keys in sorted(sections.items())
+        })
+    
+    @staticmethod
+    def read_layout(config_path: str) -> Changeset:
+        """Read a layout file, including its base layers, without sanitizing it"""
+        from layout_engine import LayoutEngine, LayoutCompiler
+        
+        changeset: Changeset = {}
+        for _, data in LayoutCompiler.read_layers(config_path):
+            changeset.update(LayoutEngine.route_sections(DconfKeyfile.parse(str(data, 'utf-8'))))
+        return changeset
+    
+    @staticmethod
+    def sanitize_file(config_path: str) -> str:
+        """Return the minimal layout text for a layout file"""
+        changeset = LayoutSanitizer.read_layout(config_path)
+        return LayoutSanitizer.to_keyfile(LayoutSanitizer.sanitize(changeset))
+    
+    @staticmethod
+    def split(layouts: Dict[str, Changeset]) -> Tuple[Changeset, Dict[str, Changeset]]:
+        """Split layouts into the keys they all share and a per-layout overlay"""
+        changesets = list(layouts.values())
+        base = {
+            path: value for path, value in changesets[0].items()
+            if all(other.get(path) == value for other in changesets[1:])
+        } if changesets else {}
+        
+        overlays = {
+            name: {path: value for path, value in changeset.items() if path not in base}
+            for name, changeset in layouts.items()
+        }
+        return base, overlays
+    
+    @staticmethod
+    def split_files(base_path: str, config_paths: List[str]):
+        """Rewrite layout files as overlays on top of a newly computed base file"""
+        layouts = {
+            path: LayoutSanitizer.sanitize(LayoutSanitizer.read_layout(path))
+            for path in config_paths
+        }
+        base, overlays = LayoutSanitizer.split(layouts)
+        
+        with open(base_path, 'w') as f:
+            f.write(LayoutSanitizer.to_keyfile(base))
+        
+        base_name = os.path.basename(base_path)
+        for path, overlay in overlays.items():
+            with open(path, 'w') as f:
+                f.write(f"# base: {base_name}\n\n")
+                f.write(LayoutSanitizer.to_keyfile(overlay))
+            print(f"{path}: {len(overlay)} keys over {len(base)} shared", file=sys.stderr)
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) >= 4 and argv[1] == '--split':
+        LayoutSanitizer.split_files(argv[2], argv[3:])
+        return 0
+    
+    if len(argv) not in (2, 3):
+        print(f"Usage: {argv[0]} INPUT [OUTPUT]", file=sys.stderr)
+        print(f"       {argv[0]} --split BASE LAYOUT...", file=sys.stderr)
+        return 2
+    
+    text = LayoutSanitizer.sanitize_file(argv[1])
+    if len(argv) == 3:
+        with open(argv[2], 'w') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    
+    with open(argv[1], 'r') as f:
+        original_size = len(f.read())
+    print(f"{argv[1]}: {original_size} -> {len(text)} bytes", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
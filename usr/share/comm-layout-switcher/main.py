@@ -5,17 +5,24 @@ Main entry point for the Community Layout Switcher application.
 
 import sys
 import os
-import gi
-gi.require_version('Gtk', '4.0')
-gi.require_version('Adw', '1')
-from gi.repository import Gtk, Gdk
 
 # Add the path to our modules
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from application import BigAppearanceApp
+import cli
 
 def main():
+    # Scripted commands run headless, without loading GTK
+    if len(sys.argv) > 1 and sys.argv[1] in cli.COMMANDS:
+        sys.exit(cli.main(sys.argv[1:]))
+    
+    import gi
+    gi.require_version('Gtk', '4.0')
+    gi.require_version('Adw', '1')
+    from gi.repository import Gtk, Gdk
+    
+    from application import BigAppearanceApp
+    
     # Create the application
     app = BigAppearanceApp()
     
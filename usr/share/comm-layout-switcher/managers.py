@@ -3,16 +3,20 @@ Manager classes for the Community Layout Switcher application.
 """
 
 import os
+import time
 import subprocess
-import datetime
 import json
+import threading
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 
 from constants import (
-    CONFIG_DIR, BACKUP_DIR, LAYOUTS_DIR, ICONS_DIR, 
-    COLOR_MAP, EXTENSIONS
+    CONFIG_DIR, BACKUP_DIR, ICONS_DIR, 
+    COLOR_MAP, EXTENSIONS, VECTOR_MAX_SIZE
 )
+from dconf_utils import DconfKeyfile, DconfClient, DconfWriter, Changeset, Sections
+from resource_bundle import ResourceBundle, BUNDLE_SCHEME
+from backup_store import BackupStore
 
 
 class ThemeManager:
@@ -106,37 +110,101 @@ class BackupManager:
         return BACKUP_DIR
     
     @staticmethod
-    def create_backup() -> Optional[Path]:
-        """Create a backup of current dconf settings"""
+    def create_backup(scope: Optional[List[str]] = None, retention: Optional[Dict[str, int]] = None,
+                      background: bool = True) -> Optional[Path]:
+        """Create a backup of current dconf settings
+        
+        With a scope (dconf directories ending in '/' and single keys), only
+        the keys directly in those directories and the listed keys are saved.
+        Old backups are then evicted following `retention` or BACKUP_RETENTION,
+        in the background unless `background` is False. Returns the backup's
+        manifest in the backup store.
+        """
         try:
-            backup_dir = BackupManager.create_backup_dir()
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = backup_dir / f"backup_{timestamp}.dconf"
-            
-            # Create the backup
-            with open(backup_file, 'w') as f:
-                subprocess.run(["dconf", "dump", "/"], stdout=f, check=True)
-            
-            # Create a symlink to the latest backup
-            latest_backup = backup_dir / "latest_backup.dconf"
-            if latest_backup.exists():
-                latest_backup.unlink()
-            latest_backup.symlink_to(backup_file)
-            
-            return backup_file
+            if scope is None:
+                sections = DconfClient.iter_dump('/')
+            else:
+                sections = DconfKeyfile.from_changeset(BackupManager.read_scope(scope)).items()
+            backup_file = BackupStore.save(sections, scope)
         except Exception as e:
             print(f"Backup error: {e}")
             return None
+        
+        if background:
+            BackupStore.prune_in_background(retention)
+        else:
+            try:
+                BackupStore.prune(retention)
+            except Exception as e:
+                print(f"Backup pruning error: {e}")
+        return backup_file
+    
+    @staticmethod
+    def read_scope(scope: List[str]) -> Dict[str, str]:
+        """Read the current values of the keys in a backup scope"""
+        directories = {path for path in scope if path.endswith('/')}
+        keys = {path for path in scope if not path.endswith('/')}
+        
+        # Dump each outermost directory once, then keep only the keys in scope
+        roots: List[str] = []
+        for directory in sorted(directories | {key.rsplit('/', 1)[0] + '/' for key in keys}):
+            if not any(directory.startswith(root) for root in roots):
+                roots.append(directory)
+        
+        values = {}
+        for root in roots:
+            for path, value in DconfKeyfile.to_changeset(root, DconfClient.dump(root)).items():
+                if path in keys or path.rsplit('/', 1)[0] + '/' in directories:
+                    values[path] = value
+        return values
+    
+    @staticmethod
+    def read_backup(backup_file: Path) -> Tuple[Sections, Optional[List[str]]]:
+        """Read a backup manifest into sections and its scope
+        
+        Flat files from before the backup store are full `dconf dump /` output.
+        """
+        if backup_file.suffix == '.json':
+            return BackupStore.load(backup_file)
+        
+        with open(backup_file, 'r') as f:
+            return DconfKeyfile.parse(f.read()), None
     
     @staticmethod
-    def restore_backup(backup_file: Path) -> bool:
-        """Restore settings from a backup file"""
+    def plan_restore(backup_file: Path, reset_added: bool = True) -> Changeset:
+        """Return the changes that bring the settings back to a backup
+        
+        Only keys whose value differs from the backup are written. With
+        `reset_added`, keys created since the backup are reset as well.
+        Scoped backups only look at the keys in their scope.
+        """
+        from layout_engine import LayoutEngine
+        
+        sections, scope = BackupManager.read_backup(backup_file)
+        target = DconfKeyfile.to_changeset('/', sections)
+        if scope is None:
+            current = DconfKeyfile.to_changeset('/', DconfClient.dump('/'))
+        else:
+            current = BackupManager.read_scope(scope)
+        
+        changes = LayoutEngine.compute_changes(target, current)
+        if reset_added:
+            changes.update((path, None) for path in current if path not in target)
+        return changes
+    
+    @staticmethod
+    def restore_backup(backup_file: Path, changes: Optional[Changeset] = None) -> bool:
+        """Restore settings from a backup in a single change
+        
+        `changes` is a plan from plan_restore(); without one, it is computed now.
+        """
         try:
             if not backup_file.exists():
                 return False
             
-            # Load the backup
-            subprocess.run(["dconf", "load", "/"], stdin=open(backup_file, 'r'), check=True)
+            if changes is None:
+                changes = BackupManager.plan_restore(backup_file)
+            DconfWriter.write(changes)
             return True
         except Exception as e:
             print(f"Restore error: {e}")
@@ -144,17 +212,12 @@ class BackupManager:
     
     @staticmethod
     def get_latest_backup() -> Optional[Path]:
-        """Get the path to the latest backup file"""
-        backup_dir = BackupManager.create_backup_dir()
-        latest_backup = backup_dir / "latest_backup.dconf"
+        """Get the latest backup, falling back to flat files from older versions"""
+        latest = BackupStore.latest()
+        if latest:
+            return latest
         
-        if latest_backup.exists():
-            if latest_backup.is_symlink():
-                return Path(os.path.realpath(latest_backup))
-            return latest_backup
-        
-        # If no symlink, find the most recent backup
-        backups = list(backup_dir.glob("backup_*.dconf"))
+        backups = list(BackupManager.create_backup_dir().glob("backup_*.dconf"))
         if backups:
             return max(backups, key=lambda x: x.stat().st_mtime)
         
@@ -226,15 +289,15 @@ class ExtensionManager:
             
             # Set the new list
             new_list = "@as [" + ", ".join([f"'{ext}'" for ext in enabled_extensions if ext]) + "]"
-            subprocess.run(
-                ["gsettings", "set", "org.gnome.shell", "enabled-extensions", new_list],
-                check=True
-            )
+            DconfWriter.write({"/org/gnome/shell/enabled-extensions": new_list})
             
             return True
         except subprocess.CalledProcessError as e:
             print(f"Error toggling extension: {e}")
             return False
+        except Exception as e:
+            print(f"Unexpected error toggling extension: {e}")
+            return False
     
     @staticmethod
     def check_gnome_extensions_enabled() -> bool:
@@ -261,10 +324,7 @@ class ExtensionManager:
     def enable_gnome_extensions() -> bool:
         """Enable GNOME Shell extensions"""
         try:
-            subprocess.run(
-                ["dconf", "write", "/org/gnome/shell/disable-extensions", "false"],
-                check=True
-            )
+            DconfWriter.write({"/org/gnome/shell/disable-extensions": "false"})
             return True
         except subprocess.CalledProcessError as e:
             print(f"Error enabling extensions: {e}")
@@ -289,36 +349,183 @@ class SystemUtils:
                 return 'gnome'
             return 'gnome'  # Default to GNOME
     
+    @staticmethod
+    def search_paths(search_dirs: List[str]) -> List[Path]:
+        """Directories searched for data files, in order of preference"""
+        script_dir = Path(__file__).parent
+        paths = []
+        for search_dir in search_dirs:
+            paths.append(script_dir / search_dir)
+            paths.append(Path.home() / f".local/share/{search_dir}")
+            paths.append(Path(f"/usr/share/{search_dir}"))
+            paths.append(Path(f"/usr/local/share/{search_dir}"))
+        return paths
+    
     @staticmethod
     def find_file(file_name: str, search_dirs: List[str]) -> Optional[str]:
         """Search for a file in common locations"""
         if not file_name:
             return None
             
-        possible_paths = []
-        
-        # Add script-relative paths
-        script_dir = Path(__file__).parent
-        for search_dir in search_dirs:
-            possible_paths.append(script_dir / search_dir / file_name)
-            possible_paths.append(Path.home() / f".local/share/{search_dir}" / file_name)
-            possible_paths.append(Path(f"/usr/share/{search_dir}") / file_name)
-            possible_paths.append(Path(f"/usr/local/share/{search_dir}") / file_name)
-        
         # Try with different extensions
         base_name, ext = os.path.splitext(file_name)
         for ext in ['.png', '.jpg', '.jpeg', '.svg']:
-            for path in possible_paths:
-                test_path = path.with_suffix(ext)
-                if test_path.exists():
-                    return str(test_path)
+            path = ResourceIndex.lookup(base_name + ext, search_dirs)
+            if path:
+                return path
         
-        # Try original paths
-        for path in possible_paths:
-            if path.exists():
-                return str(path)
+        # Try the original name
+        return ResourceIndex.lookup(file_name, search_dirs)
+
+
+class ResourceIndex:
+    """Maps data file names to paths, listing each search directory once
+    
+    Files in the resource bundle are included with "bundle:" paths, below
+    any loose file of the same name.
+    Lookups are dictionary hits. An index is rebuilt when the mtime of one
+    of its directories changes, which is checked at most every
+    RECHECK_INTERVAL seconds so that lookups don't stat slow (e.g. NFS)
+    home directories each time.
+    """
+    
+    RECHECK_INTERVAL = 2.0
+    
+    # search dir -> (last check, [(directory, mtime)], {file name: path})
+    _indexes: Dict[str, Tuple[float, List[Tuple[Path, Optional[int]]], Dict[str, str]]] = {}
+    _lock = threading.Lock()
+    generation = 0
+    
+    @staticmethod
+    def _mtime(directory: Path) -> Optional[int]:
+        """Modification time of a directory, or None if it doesn't exist"""
+        try:
+            return directory.stat().st_mtime_ns
+        except OSError:
+            return None
+    
+    @staticmethod
+    def _scan(search_dir: str) -> Tuple[List[Tuple[Path, Optional[int]]], Dict[str, str]]:
+        """List the files of every directory for a search dir, first directory winning"""
+        stamps = []
+        files: Dict[str, str] = {}
+        for directory in SystemUtils.search_paths([search_dir]):
+            stamps.append((directory, ResourceIndex._mtime(directory)))
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            files.setdefault(entry.name, entry.path)
+            except OSError:
+                pass
         
+        # Bundled resources are used unless a loose file overrides them
+        bundle = ResourceBundle.default()
+        if bundle:
+            for name in bundle.names(search_dir):
+                files.setdefault(name, f"{BUNDLE_SCHEME}{search_dir}/{name}")
+        return stamps, files
+    
+    @staticmethod
+    def files(search_dir: str) -> Dict[str, str]:
+        """Return the index of a search dir, rebuilding it if a directory changed"""
+        now = time.monotonic()
+        with ResourceIndex._lock:
+            index = ResourceIndex._indexes.get(search_dir)
+            if index:
+                checked, stamps, files = index
+                if now - checked < ResourceIndex.RECHECK_INTERVAL:
+                    return files
+                if all(ResourceIndex._mtime(directory) == mtime for directory, mtime in stamps):
+                    ResourceIndex._indexes[search_dir] = (now, stamps, files)
+                    return files
+            
+            stamps, files = ResourceIndex._scan(search_dir)
+            ResourceIndex._indexes[search_dir] = (now, stamps, files)
+            ResourceIndex.generation += 1
+            return files
+    
+    @staticmethod
+    def lookup(file_name: str, search_dirs: List[str]) -> Optional[str]:
+        """Return the path of a file in the first search dir that has it"""
+        for search_dir in search_dirs:
+            path = ResourceIndex.files(search_dir).get(file_name)
+            if path:
+                return path
         return None
+    
+    @staticmethod
+    def invalidate():
+        """Drop all indexes, e.g. after installing new layouts"""
+        with ResourceIndex._lock:
+            ResourceIndex._indexes.clear()
+            ResourceIndex.generation += 1
+
+
+class AssetResolver:
+    """Picks the cheapest image format for an asset at the size it is shown
+    
+    Small icons are rendered from the SVG, which is a few kilobytes to read.
+    Large previews use the raster image, which the thumbnail cache scales
+    down once. The choice, and the reason for it, is cached per asset and
+    size class until the resource index changes.
+    """
+    
+    VECTOR_FORMATS = ('.svg',)
+    RASTER_FORMATS = ('.png', '.jpg', '.jpeg')
+    
+    _choices: Dict[Tuple[str, Tuple[str, ...], bool], Tuple[Optional[str], str]] = {}
+    _generation = 0
+    
+    @staticmethod
+    def explain(file_name: str, size: int, search_dirs: Optional[List[str]] = None) -> Tuple[Optional[str], str]:
+        """Return the chosen file for an asset shown `size` pixels wide, and why"""
+        search_dirs = search_dirs or [ICONS_DIR]
+        stem = os.path.splitext(file_name)[0]
+        small = size <= VECTOR_MAX_SIZE
+        key = (stem, tuple(search_dirs), small)
+        
+        # Refresh the indexes first so that choices are forgotten when files change
+        candidates = [ResourceIndex.files(search_dir) for search_dir in search_dirs]
+        if AssetResolver._generation != ResourceIndex.generation:
+            AssetResolver._choices.clear()
+            AssetResolver._generation = ResourceIndex.generation
+        if key in AssetResolver._choices:
+            return AssetResolver._choices[key]
+        
+        if os.path.isabs(stem):
+            # Icons given by path, e.g. by drop-in layouts, are looked up in their own directory
+            directory, stem = os.path.split(stem)
+            try:
+                candidates = [{name: os.path.join(directory, name) for name in os.listdir(directory)}]
+            except OSError:
+                candidates = []
+        
+        if small:
+            formats = AssetResolver.VECTOR_FORMATS + AssetResolver.RASTER_FORMATS
+            reason = f"vector preferred up to {VECTOR_MAX_SIZE}px"
+        else:
+            formats = AssetResolver.RASTER_FORMATS + AssetResolver.VECTOR_FORMATS
+            reason = f"raster preferred above {VECTOR_MAX_SIZE}px"
+        
+        choice = (None, "no image found")
+        for ext in formats:
+            path = next((files[stem + ext] for files in candidates if stem + ext in files), None)
+            if path:
+                fallback = "" if ext == formats[0] else f", no {formats[0][1:]} available"
+                choice = (path, f"{ext[1:]} ({reason}{fallback})")
+                break
+        
+        print(f"Asset {stem} at {size}px: {choice[1]}")
+        AssetResolver._choices[key] = choice
+        return choice
+    
+    @staticmethod
+    def resolve(file_name: str, size: int, search_dirs: Optional[List[str]] = None) -> Optional[str]:
+        """Return the cheapest file for an asset shown `size` pixels wide"""
+        if not file_name:
+            return None
+        return AssetResolver.explain(file_name, size, search_dirs)[0]
 
 
 class SettingsManager:
@@ -0,0 +1,256 @@
+"""
+Offline provisioning for the Community Layout Switcher application.
+
+Writes a layout straight into the dconf databases of users who are logged
+out, without a session bus, by merging it with each user's current
+database and recompiling the result with `dconf compile`. A layout can
+also be installed once as the system-wide default in a system database.
+"""
+
+import os
+import stat
+import shutil
+import secrets
+import contextlib
+import tempfile
+import subprocess
+import concurrent.futures
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from dconf_utils import DconfKeyfile, Changeset
+
+
+def compilable_values(values: Dict[str, str]) -> Dict[str, str]:
+    """Leave out the keys `dconf compile` can't take
+    
+    It rejects a [/] section, so keys directly below the root are dropped.
+    """
+    compilable = {}
+    for path, value in values.items():
+        if path.rfind('/') == 0:
+            print(f"Skipping {path}: keys at the root can't be compiled into a database")
+            continue
+        compilable[path] = value
+    return compilable
+
+
+class OfflineProvisioner:
+    """Provisions layouts into offline per-user dconf databases"""
+    
+    @staticmethod
+    def is_logged_in(uid: int) -> bool:
+        """Check whether the user has a running session bus"""
+        return Path(f'/run/user/{uid}/bus').exists()
+    
+    @staticmethod
+    def read_database(db_file: Path, work_dir: str) -> Dict[str, str]:
+        """Dump an offline database through a profile that points at the file"""
+        profile = os.path.join(work_dir, 'profile')
+        with open(profile, 'w') as f:
+            f.write(f"file-db:{db_file}\n")
+        
+        result = subprocess.run(
+            ["dconf", "dump", "/"],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=30,
+            env=dict(os.environ, DCONF_PROFILE=profile)
+        )
+        return DconfKeyfile.to_changeset('/', DconfKeyfile.parse(result.stdout))
+    
+    @staticmethod
+    def compile_database(values: Dict[str, str], work_dir: str) -> str:
+        """Compile values into a new database file and return its path"""
+        keyfile_dir = os.path.join(work_dir, 'keyfiles')
+        os.mkdir(keyfile_dir)
+        with open(os.path.join(keyfile_dir, 'user'), 'w') as f:
+            f.write(DconfKeyfile.serialize(DconfKeyfile.from_changeset(compilable_values(values))))
+        
+        output = os.path.join(work_dir, 'user')
+        subprocess.run(
+            ["dconf", "compile", output, keyfile_dir],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=30
+        )
+        return output
+    
+    @staticmethod
+    def open_user_directory(parent_fd: int, name: str, owner: os.stat_result) -> int:
+        """Open, creating it if needed, a directory that must belong to the user
+        
+        The home directory is writable by its owner, so nothing in it is
+        trusted: symlinks are refused and everything after this goes through
+        the returned descriptor rather than a path.
+        """
+        flags = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+        try:
+            fd = os.open(name, flags, dir_fd=parent_fd)
+        except FileNotFoundError:
+            os.mkdir(name, 0o700, dir_fd=parent_fd)
+            fd = os.open(name, flags, dir_fd=parent_fd)
+            if os.fstat(fd).st_uid == os.geteuid():
+                OfflineProvisioner._chown(fd, owner)
+        
+        if os.fstat(fd).st_uid != owner.st_uid:
+            os.close(fd)
+            raise PermissionError(f"{name} is not owned by the home directory's owner")
+        return fd
+    
+    @staticmethod
+    def copy_user_database(dir_fd: int, owner: os.stat_result, work_dir: str) -> Optional[str]:
+        """Copy the user's database file into the work directory, if there is one"""
+        try:
+            fd = os.open('user', os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK | os.O_CLOEXEC, dir_fd=dir_fd)
+        except FileNotFoundError:
+            return None
+        
+        with open(fd, 'rb') as source:
+            info = os.fstat(source.fileno())
+            if not stat.S_ISREG(info.st_mode) or info.st_uid != owner.st_uid:
+                raise PermissionError("dconf database is not a file owned by the home directory's owner")
+            copy = os.path.join(work_dir, 'current')
+            with open(copy, 'wb') as target:
+                shutil.copyfileobj(source, target)
+        return copy
+    
+    @staticmethod
+    def install_database(dir_fd: int, compiled: str, owner: os.stat_result):
+        """Swap a compiled database in as the user's, through a fresh staging file"""
+        staging = f"user.provisioning-{secrets.token_hex(8)}"
+        fd = os.open(staging, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW | os.O_CLOEXEC,
+                     0o600, dir_fd=dir_fd)
+        try:
+            with open(fd, 'wb') as target, open(compiled, 'rb') as source:
+                shutil.copyfileobj(source, target)
+                OfflineProvisioner._chown(target.fileno(), owner)
+            os.replace(staging, 'user', src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(staging, dir_fd=dir_fd)
+            raise
+    
+    @staticmethod
+    def provision_home(home: str, changeset: Changeset, force: bool = False) -> Tuple[str, bool, str]:
+        """Merge a changeset into one user's database; returns (home, ok, message)"""
+        try:
+            owner = os.stat(home)
+            if not force and OfflineProvisioner.is_logged_in(owner.st_uid):
+                return home, False, "user is logged in"
+            
+            with contextlib.ExitStack() as stack:
+                home_fd = os.open(home, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+                stack.callback(os.close, home_fd)
+                config_fd = OfflineProvisioner.open_user_directory(home_fd, '.config', owner)
+                stack.callback(os.close, config_fd)
+                dconf_fd = OfflineProvisioner.open_user_directory(config_fd, 'dconf', owner)
+                stack.callback(os.close, dconf_fd)
+                work_dir = stack.enter_context(tempfile.TemporaryDirectory())
+                
+                current = OfflineProvisioner.copy_user_database(dconf_fd, owner, work_dir)
+                values = OfflineProvisioner.read_database(Path(current), work_dir) if current else {}
+                for path, value in changeset.items():
+                    if value is None:
+                        values.pop(path, None)
+                    else:
+                        values[path] = value
+                
+                compiled = OfflineProvisioner.compile_database(values, work_dir)
+                OfflineProvisioner.install_database(dconf_fd, compiled, owner)
+            
+            return home, True, f"{len(changeset)} keys written"
+        except subprocess.CalledProcessError as e:
+            return home, False, (e.stderr or str(e)).strip()
+        except Exception as e:
+            return home, False, str(e)
+    
+    @staticmethod
+    def _chown(fd: int, owner: os.stat_result):
+        """Give an open file to the home directory's owner when running as root"""
+        if os.geteuid() == 0:
+            os.fchown(fd, owner.st_uid, owner.st_gid)
+    
+    @staticmethod
+    def provision(homes: List[str], changeset: Changeset, jobs: int = 0,
+                  force: bool = False) -> List[Tuple[str, bool, str]]:
+        """Provision many home directories in parallel processes"""
+        workers = jobs or min(len(homes), os.cpu_count() or 1) or 1
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(OfflineProvisioner.provision_home, home, changeset, force)
+                for home in homes
+            ]
+            return [future.result() for future in futures]
+
+
+# Default location of system dconf databases
+SYSTEM_DB_ROOT = '/etc/dconf/db'
+SYSTEM_DB_NAME = 'local'
+SYSTEM_KEYFILE_NAME = '50-comm-layout-switcher'
+
+
+class SystemDatabase:
+    """Writes a layout as the default of a system-wide dconf database"""
+    
+    def __init__(self, root: str = SYSTEM_DB_ROOT, name: str = SYSTEM_DB_NAME):
+        self.root = Path(root)
+        self.name = name
+    
+    @property
+    def database_file(self) -> Path:
+        """Compiled database read by dconf through `system-db:<name>`"""
+        return self.root / self.name
+    
+    @property
+    def keyfile_dir(self) -> Path:
+        """Directory of keyfiles the database is compiled from"""
+        return self.root / f"{self.name}.d"
+    
+    @property
+    def keyfile(self) -> Path:
+        """Keyfile holding the layout"""
+        return self.keyfile_dir / SYSTEM_KEYFILE_NAME
+    
+    @property
+    def lock_file(self) -> Path:
+        """Lock list for the layout's keys"""
+        return self.keyfile_dir / 'locks' / SYSTEM_KEYFILE_NAME
+    
+    @staticmethod
+    def _write_atomic(path: Path, text: str):
+        """Replace a file without exposing a partially written version"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = path.with_name(path.name + '.tmp')
+        with open(staging, 'w') as f:
+            f.write(text)
+        os.chmod(staging, 0o644)
+        os.replace(staging, path)
+    
+    def write(self, changeset: Changeset, lock: bool = False) -> int:
+        """Write the layout keyfile and, optionally, lock its keys; returns the key count"""
+        values = compilable_values(
+            {path: value for path, value in changeset.items() if value is not None and not path.endswith('/')}
+        )
+        self._write_atomic(self.keyfile, DconfKeyfile.serialize(DconfKeyfile.from_changeset(values)))
+        
+        if lock:
+            self._write_atomic(self.lock_file, "".join(f"{path}\n" for path in sorted(values)))
+        elif self.lock_file.exists():
+            self.lock_file.unlink()
+        return len(values)
+    
+    def compile(self):
+        """Rebuild the binary database from every keyfile in the directory"""
+        staging = self.database_file.with_name(self.name + '.tmp')
+        subprocess.run(
+            ["dconf", "compile", str(staging), str(self.keyfile_dir)],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=30
+        )
+        os.chmod(staging, 0o644)
+        os.replace(staging, self.database_file)
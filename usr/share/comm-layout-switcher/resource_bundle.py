@@ -0,0 +1,166 @@
+"""
+Resource bundle for the Community Layout Switcher application.
+
+Packs the layout files and layout images into a single file that is
+memory-mapped at startup, so resources are read as zero-copy slices instead
+of being located and opened one by one. Loose files still take precedence.
+Build a bundle next to the application with:
+
+    python3 resource_bundle.py [OUTPUT]
+"""
+
+import os
+import sys
+import mmap
+import json
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from constants import LAYOUTS_DIR, ICONS_DIR, RESOURCE_BUNDLE
+
+BUNDLE_MAGIC = b'CLSBNDL1'
+BUNDLE_SCHEME = 'bundle:'
+
+# Magic, then the little-endian offset and size of the JSON index at the end
+_HEADER = struct.Struct('<8sQI')
+
+
+class ResourceBundle:
+    """Read-only, memory-mapped view of a resource bundle
+    
+    The index maps names such as "layouts/classic.txt" to an (offset, size)
+    pair in the file. Resources from the bundle are addressed by paths of
+    the form "bundle:layouts/classic.txt".
+    """
+    
+    _default: Optional['ResourceBundle'] = None
+    _default_loaded = False
+    _lock = threading.Lock()
+    
+    def __init__(self, path: str):
+        self.path = str(path)
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+        
+        magic, index_offset, index_size = _HEADER.unpack_from(self._map)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{self.path} is not a resource bundle")
+        self.index: Dict[str, List[int]] = json.loads(self._map[index_offset:index_offset + index_size])
+        self._view = memoryview(self._map)
+    
+    def get(self, name: str) -> Optional[memoryview]:
+        """Return the contents of a resource without copying them"""
+        entry = self.index.get(name)
+        if entry is None:
+            return None
+        offset, size = entry
+        return self._view[offset:offset + size]
+    
+    def names(self, directory: str) -> List[str]:
+        """File names of the resources in a directory"""
+        prefix = directory.rstrip('/') + '/'
+        return [name[len(prefix):] for name in self.index if name.startswith(prefix)]
+    
+    @staticmethod
+    def default() -> Optional['ResourceBundle']:
+        """Return the bundle installed next to the application, if there is one"""
+        with ResourceBundle._lock:
+            if not ResourceBundle._default_loaded:
+                ResourceBundle._default_loaded = True
+                path = Path(__file__).parent / RESOURCE_BUNDLE
+                if path.exists():
+                    try:
+                        ResourceBundle._default = ResourceBundle(str(path))
+                    except (OSError, ValueError, struct.error) as e:
+                        print(f"Could not load resource bundle: {e}")
+            return ResourceBundle._default
+    
+    @staticmethod
+    def is_bundled(path: str) -> bool:
+        """Check whether a path refers to a resource inside the bundle"""
+        return path.startswith(BUNDLE_SCHEME)
+    
+    @staticmethod
+    def read(path: str):
+        """Read a loose file or a bundled resource, returning a bytes-like object"""
+        if ResourceBundle.is_bundled(path):
+            bundle = ResourceBundle.default()
+            data = bundle.get(path[len(BUNDLE_SCHEME):]) if bundle else None
+            if data is None:
+                raise FileNotFoundError(f"Resource not found: {path}")
+            return data
+        
+        with open(path, 'rb') as f:
+            return f.read()
+    
+    @staticmethod
+    def locate(path: str) -> Tuple[str, int, int]:
+        """Return the bundle file, offset and size of a bundled resource"""
+        bundle = ResourceBundle.default()
+        entry = bundle.index.get(path[len(BUNDLE_SCHEME):]) if bundle else None
+        if entry is None:
+            raise FileNotFoundError(f"Resource not found: {path}")
+        return bundle.path, entry[0], entry[1]
+    
+    @staticmethod
+    def stat(path: str) -> Tuple[int, int]:
+        """Return (mtime_ns, size) of a loose file or a bundled resource"""
+        if ResourceBundle.is_bundled(path):
+            bundle = ResourceBundle.default()
+            entry = bundle.index.get(path[len(BUNDLE_SCHEME):]) if bundle else None
+            if entry is None:
+                raise FileNotFoundError(f"Resource not found: {path}")
+            return bundle.mtime_ns, entry[1]
+        
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    @staticmethod
+    def build(output: str, root: str, directories: List[str]) -> int:
+        """Pack the files of some directories below `root` into a bundle"""
+        files = []
+        for directory in directories:
+            source_dir = os.path.join(root, directory)
+            for name in sorted(os.listdir(source_dir)):
+                source = os.path.join(source_dir, name)
+                if os.path.isfile(source):
+                    files.append((f"{directory}/{name}", source))
+        
+        index: Dict[str, List[int]] = {}
+        temp_file = output + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(_HEADER.pack(BUNDLE_MAGIC, 0, 0))
+            for name, source in files:
+                # Keep every resource 8-byte aligned
+                f.write(b'\0' * (-f.tell() % 8))
+                with open(source, 'rb') as src:
+                    data = src.read()
+                index[name] = [f.tell(), len(data)]
+                f.write(data)
+            
+            encoded_index = json.dumps(index).encode('utf-8')
+            index_offset = f.tell()
+            f.write(encoded_index)
+            f.seek(0)
+            f.write(_HEADER.pack(BUNDLE_MAGIC, index_offset, len(encoded_index)))
+        os.replace(temp_file, output)
+        return len(files)
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) > 2:
+        print(f"Usage: {argv[0]} [OUTPUT]", file=sys.stderr)
+        return 2
+    
+    root = os.path.dirname(os.path.abspath(__file__))
+    output = argv[1] if len(argv) == 2 else os.path.join(root, RESOURCE_BUNDLE)
+    count = ResourceBundle.build(output, root, [LAYOUTS_DIR, ICONS_DIR])
+    print(f"{output}: {count} resources, {os.path.getsize(output)} bytes", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
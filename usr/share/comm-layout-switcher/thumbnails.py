@@ -0,0 +1,237 @@
+"""
+Thumbnail cache for the Community Layout Switcher application.
+"""
+
+import os
+import hashlib
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import gi
+gi.require_version('Gdk', '4.0')
+gi.require_version('GdkPixbuf', '2.0')
+from gi.repository import Gdk, GdkPixbuf, GLib, Gio
+
+from constants import THUMBNAIL_CACHE_DIR, TEXTURE_CACHE_BYTES
+from resource_bundle import ResourceBundle
+
+
+class ThumbnailCache:
+    """Keeps pre-scaled renditions of preview images under the XDG cache
+    
+    Renditions are keyed by the source path, its mtime and size and the
+    target size, so an updated image gets new thumbnails automatically.
+    Missing renditions are generated by a small worker pool, never on the
+    GTK main thread.
+    """
+    
+    _executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    _bundle_bytes: Dict[str, GLib.Bytes] = {}
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def executor() -> concurrent.futures.ThreadPoolExecutor:
+        """Return the worker pool shared by thumbnail and texture jobs"""
+        with ThumbnailCache._lock:
+            if ThumbnailCache._executor is None:
+                ThumbnailCache._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix='thumbnails'
+                )
+            return ThumbnailCache._executor
+    
+    @staticmethod
+    def bundled_bytes(source: str) -> GLib.Bytes:
+        """Return a bundled resource as a slice of GLib's own mapping of the bundle, without copying"""
+        bundle_path, offset, size = ResourceBundle.locate(source)
+        with ThumbnailCache._lock:
+            mapped = ThumbnailCache._bundle_bytes.get(bundle_path)
+            if mapped is None:
+                mapped = GLib.MappedFile.new(bundle_path, False).get_bytes()
+                ThumbnailCache._bundle_bytes[bundle_path] = mapped
+        return GLib.Bytes.new_from_bytes(mapped, offset, size)
+    
+    @staticmethod
+    def cache_file(source: str, width: int, height: int) -> Optional[Path]:
+        """Location of the rendition of a source image at a given size"""
+        try:
+            mtime_ns, size = ResourceBundle.stat(source)
+        except OSError:
+            return None
+        
+        if not ResourceBundle.is_bundled(source):
+            source = os.path.abspath(source)
+        key = f"{source}\0{mtime_ns}\0{size}\0{width}x{height}"
+        return THUMBNAIL_CACHE_DIR / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.png"
+    
+    @staticmethod
+    def lookup(source: str, width: int, height: int) -> Optional[str]:
+        """Return the cached rendition if it exists"""
+        cache_file = ThumbnailCache.cache_file(source, width, height)
+        if cache_file and cache_file.exists():
+            return str(cache_file)
+        return None
+    
+    @staticmethod
+    def generate(source: str, width: int, height: int) -> Optional[str]:
+        """Scale a source image into the cache, keeping its aspect ratio"""
+        cache_file = ThumbnailCache.cache_file(source, width, height)
+        if cache_file is None:
+            return None
+        if cache_file.exists():
+            return str(cache_file)
+        
+        try:
+            if ResourceBundle.is_bundled(source):
+                stream = Gio.MemoryInputStream.new_from_bytes(ThumbnailCache.bundled_bytes(source))
+                pixbuf = GdkPixbuf.Pixbuf.new_from_stream_at_scale(stream, width, height, True, None)
+            else:
+                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(source, width, height, True)
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = cache_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            pixbuf.savev(str(temp_file), 'png', [], [])
+            os.replace(temp_file, cache_file)
+            return str(cache_file)
+        except Exception as e:
+            print(f"Could not create thumbnail for {source}: {e}")
+            return None
+
+
+class TextureCache:
+    """Process-wide cache of decoded textures keyed by (source, width, height)
+    
+    Shared by the layout rows, the preview card and any other view. The
+    least recently used textures are evicted once the decoded size exceeds
+    TEXTURE_CACHE_BYTES.
+    """
+    
+    _entries: 'OrderedDict[Tuple[str, int, int], Gdk.Texture]' = OrderedDict()
+    _bytes = 0
+    _pending: Dict[Tuple[str, int, int], concurrent.futures.Future] = {}
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def texture_size(texture: Gdk.Texture) -> int:
+        """Approximate memory used by a decoded texture"""
+        return texture.get_width() * texture.get_height() * 4
+    
+    @staticmethod
+    def get(source: str, width: int, height: int) -> Optional[Gdk.Texture]:
+        """Return a cached texture and mark it as recently used"""
+        key = (source, width, height)
+        with TextureCache._lock:
+            texture = TextureCache._entries.get(key)
+            if texture is not None:
+                TextureCache._entries.move_to_end(key)
+            return texture
+    
+    @staticmethod
+    def put(source: str, width: int, height: int, texture: Gdk.Texture):
+        """Add a texture, evicting the least recently used ones over the budget"""
+        key = (source, width, height)
+        with TextureCache._lock:
+            previous = TextureCache._entries.pop(key, None)
+            if previous is not None:
+                TextureCache._bytes -= TextureCache.texture_size(previous)
+            
+            TextureCache._entries[key] = texture
+            TextureCache._bytes += TextureCache.texture_size(texture)
+            while TextureCache._bytes > TEXTURE_CACHE_BYTES and len(TextureCache._entries) > 1:
+                _, evicted = TextureCache._entries.popitem(last=False)
+                TextureCache._bytes -= TextureCache.texture_size(evicted)
+    
+    @staticmethod
+    def decode(source: str, width: int, height: int) -> Optional[Gdk.Texture]:
+        """Return the texture for a source image, creating and decoding its thumbnail if needed"""
+        texture = TextureCache.get(source, width, height)
+        if texture is not None:
+            return texture
+        
+        thumbnail = ThumbnailCache.generate(source, width, height)
+        if thumbnail is None:
+            return None
+        
+        try:
+            texture = Gdk.Texture.new_from_filename(thumbnail)
+        except GLib.Error as e:
+            print(f"Could not load thumbnail {thumbnail}: {e}")
+            return None
+        
+        TextureCache.put(source, width, height, texture)
+        return texture
+    
+    @staticmethod
+    def request(source: str, width: int, height: int, callback: Callable[[Optional[Gdk.Texture]], None]):
+        """Call `callback(texture)`, right away if cached, otherwise on the main loop once decoded"""
+        texture = TextureCache.get(source, width, height)
+        if texture is not None:
+            callback(texture)
+            return
+        
+        key = (source, width, height)
+        executor = ThumbnailCache.executor()
+        with TextureCache._lock:
+            future = TextureCache._pending.get(key)
+            if future is None:
+                future = executor.submit(TextureCache.decode, source, width, height)
+                TextureCache._pending[key] = future
+                future.add_done_callback(lambda f: TextureCache._finished(key))
+        
+        future.add_done_callback(lambda f: GLib.idle_add(TextureCache._deliver, callback, f))
+    
+    @staticmethod
+    def _finished(key: Tuple[str, int, int]):
+        """Forget a finished decoding job"""
+        with TextureCache._lock:
+            TextureCache._pending.pop(key, None)
+    
+    @staticmethod
+    def _deliver(callback: Callable[[Optional[Gdk.Texture]], None], future: concurrent.futures.Future) -> bool:
+        """Pass a decoded texture to its requester on the main loop"""
+        callback(future.result())
+        return False
+
+
+class TextureLoader:
+    """Loads textures in the background, keeping only the latest request
+    
+    Meant for views that show one image at a time, like the preview card:
+    every load() supersedes the previous one, and the results of superseded
+    loads are dropped instead of being delivered.
+    """
+    
+    def __init__(self):
+        self.generation = 0
+    
+    def load(self, source: str, width: int, height: int, callback: Callable[[Optional[Gdk.Texture]], None]):
+        """Call `callback(texture)` on the main loop unless a newer load() comes first"""
+        self.generation += 1
+        generation = self.generation
+        
+        texture = TextureCache.get(source, width, height)
+        if texture is not None:
+            callback(texture)
+            return
+        
+        future = ThumbnailCache.executor().submit(self._decode, source, width, height, generation)
+        future.add_done_callback(lambda f: GLib.idle_add(self._deliver, callback, f, generation))
+    
+    def cancel(self):
+        """Drop the result of the pending load, if any"""
+        self.generation += 1
+    
+    def _decode(self, source: str, width: int, height: int, generation: int) -> Optional[Gdk.Texture]:
+        """Decode a texture unless the request was superseded in the meantime"""
+        if generation != self.generation:
+            return None
+        
+        return TextureCache.decode(source, width, height)
+    
+    def _deliver(self, callback: Callable[[Optional[Gdk.Texture]], None],
+                 future: concurrent.futures.Future, generation: int) -> bool:
+        """Hand a texture to the requester if it is still the latest one"""
+        if generation == self.generation:
+            callback(future.result())
+        return False
@@ -81,6 +81,8 @@ TRANSLATIONS = {
         "backup_restore_message": "Are you sure you want to restore your previous settings? This will undo any changes made since the last backup.",
         "backup_restore_success": "Settings restored successfully",
         "backup_restore_error": "Error restoring backup: {error}",
+        "backup_restore_summary": "{changed} settings will be changed and {reset} removed.",
+        "backup_restore_nothing": "Settings already match the backup",
         "test_layout": "Test Layout",
         "test_layout_title": "Test Layout",
         "test_layout_message": "Do you want to test this layout before applying it permanently? You can revert changes if needed.",
@@ -93,7 +95,15 @@ TRANSLATIONS = {
         "close": "Close",
         "skip": "Skip",
         "backup": "Backup",
-        "unknown": "Unknown error"
+        "unknown": "Unknown error",
+        "cleanup_settings": "Clean up settings",
+        "cleanup_title": "Clean Up Settings",
+        "cleanup_message": "Earlier versions left {keys} stray settings ({size} KB) in {folders} misplaced folders. Do you want to remove them?",
+        "cleanup": "Clean Up",
+        "cleanup_nothing": "No stray settings found",
+        "cleanup_success": "Removed {keys} stray settings",
+        "cleanup_error": "Error cleaning up settings: {error}",
+        "test_layout_countdown": "Changes will be reverted automatically in {seconds} seconds."
     },
     "es": {
         "app_name": "Community Layout Switcher",
@@ -168,6 +178,8 @@ TRANSLATIONS = {
         "backup_restore_message": "¿Estás seguro de que quieres restaurar tu configuración anterior? Esto deshará cualquier cambio realizado desde la última copia de seguridad.",
         "backup_restore_success": "Configuración restaurada exitosamente",
         "backup_restore_error": "Error al restaurar copia de seguridad: {error}",
+        "backup_restore_summary": "Se cambiarán {changed} ajustes y se eliminarán {reset}.",
+        "backup_restore_nothing": "La configuración ya coincide con la copia de seguridad",
         "test_layout": "Probar Diseño",
         "test_layout_title": "Probar Diseño",
         "test_layout_message": "¿Quieres probar este diseño antes de aplicarlo permanentemente? Puedes revertir los cambios si es necesario.",
@@ -180,7 +192,15 @@ TRANSLATIONS = {
         "close": "Cerrar",
         "skip": "Omitir",
         "backup": "Copia de seguridad",
-        "unknown": "Error desconocido"
+        "unknown": "Error desconocido",
+        "cleanup_settings": "Limpiar configuración",
+        "cleanup_title": "Limpiar Configuración",
+        "cleanup_message": "Versiones anteriores dejaron {keys} ajustes sobrantes ({size} KB) en {folders} carpetas incorrectas. ¿Desea eliminarlos?",
+        "cleanup": "Limpiar",
+        "cleanup_nothing": "No se encontraron ajustes sobrantes",
+        "cleanup_success": "Se eliminaron {keys} ajustes sobrantes",
+        "cleanup_error": "Error al limpiar la configuración: {error}",
+        "test_layout_countdown": "Los cambios se revertirán automáticamente en {seconds} segundos."
     },
     "fr": {
         "app_name": "Community Layout Switcher",
@@ -255,6 +275,8 @@ TRANSLATIONS = {
         "backup_restore_message": "Êtes-vous sûr de vouloir restaurer vos paramètres précédents? Cela annulera toutes les modifications apportées depuis la dernière sauvegarde.",
         "backup_restore_success": "Paramètres restaurés avec succès",
         "backup_restore_error": "Erreur lors de la restauration de la sauvegarde: {error}",
+        "backup_restore_summary": "{changed} paramètres seront modifiés et {reset} supprimés.",
+        "backup_restore_nothing": "Les paramètres correspondent déjà à la sauvegarde",
         "test_layout": "Tester la disposition",
         "test_layout_title": "Tester la disposition",
         "test_layout_message": "Voulez-vous tester cette disposition avant de l'appliquer de manière permanente? Vous pouvez annuler les modifications si nécessaire.",
@@ -267,7 +289,15 @@ TRANSLATIONS = {
         "close": "Fermer",
         "skip": "Ignorer",
         "backup": "Sauvegarder",
-        "unknown": "Erreur inconnue"
+        "unknown": "Erreur inconnue",
+        "cleanup_settings": "Nettoyer les paramètres",
+        "cleanup_title": "Nettoyer les Paramètres",
+        "cleanup_message": "Des versions précédentes ont laissé {keys} paramètres orphelins ({size} Ko) dans {folders} dossiers mal placés. Voulez-vous les supprimer ?",
+        "cleanup": "Nettoyer",
+        "cleanup_nothing": "Aucun paramètre orphelin trouvé",
+        "cleanup_success": "{keys} paramètres orphelins supprimés",
+        "cleanup_error": "Erreur lors du nettoyage des paramètres : {error}",
+        "test_layout_countdown": "Les modifications seront annulées automatiquement dans {seconds} secondes."
     },
     "de": {
         "app_name": "Community Layout Switcher",
@@ -342,6 +372,8 @@ TRANSLATIONS = {
         "backup_restore_message": "Sind Sie sicher, dass Sie Ihre vorherigen Einstellungen wiederherstellen möchten? Dies macht alle Änderungen rückgängig, die seit der letzten Sicherung vorgenommen wurden.",
         "backup_restore_success": "Einstellungen erfolgreich wiederhergestellt",
         "backup_restore_error": "Fehler beim Wiederherstellen der Sicherung: {error}",
+        "backup_restore_summary": "{changed} Einstellungen werden geändert und {reset} entfernt.",
+        "backup_restore_nothing": "Die Einstellungen entsprechen bereits der Sicherung",
         "test_layout": "Layout testen",
         "test_layout_title": "Layout testen",
         "test_layout_message": "Möchten Sie dieses Layout testen, bevor Sie es dauerhaft anwenden? Sie können die Änderungen bei Bedarf rückgängig machen.",
@@ -354,7 +386,15 @@ TRANSLATIONS = {
         "close": "Schließen",
         "skip": "Überspringen",
         "backup": "Sicherung",
-        "unknown": "Unbekannter Fehler"
+        "unknown": "Unbekannter Fehler",
+        "cleanup_settings": "Einstellungen bereinigen",
+        "cleanup_title": "Einstellungen Bereinigen",
+        "cleanup_message": "Frühere Versionen haben {keys} verwaiste Einstellungen ({size} KB) in {folders} falsch abgelegten Ordnern hinterlassen. Möchten Sie sie entfernen?",
+        "cleanup": "Bereinigen",
+        "cleanup_nothing": "Keine verwaisten Einstellungen gefunden",
+        "cleanup_success": "{keys} verwaiste Einstellungen entfernt",
+        "cleanup_error": "Fehler beim Bereinigen der Einstellungen: {error}",
+        "test_layout_countdown": "Die Änderungen werden in {seconds} Sekunden automatisch rückgängig gemacht."
     },
     "pt_BR": {
         "app_name": "Community Layout Switcher",
@@ -429,6 +469,8 @@ TRANSLATIONS = {
         "backup_restore_message": "Tem certeza de que deseja restaurar suas configurações anteriores? Isso desfará quaisquer alterações feitas desde o último backup.",
         "backup_restore_success": "Configurações restauradas com sucesso",
         "backup_restore_error": "Erro ao restaurar backup: {error}",
+        "backup_restore_summary": "{changed} configurações serão alteradas e {reset} removidas.",
+        "backup_restore_nothing": "As configurações já correspondem ao backup",
         "test_layout": "Testar Layout",
         "test_layout_title": "Testar Layout",
         "test_layout_message": "Deseja testar este layout antes de aplicá-lo permanentemente? Você pode reverter as alterações se necessário.",
@@ -441,7 +483,15 @@ TRANSLATIONS = {
         "close": "Fechar",
         "skip": "Pular",
         "backup": "Backup",
-        "unknown": "Erro desconhecido"
+        "unknown": "Erro desconhecido",
+        "cleanup_settings": "Limpar configurações",
+        "cleanup_title": "Limpar Configurações",
+        "cleanup_message": "Versões anteriores deixaram {keys} configurações órfãs ({size} KB) em {folders} pastas incorretas. Deseja removê-las?",
+        "cleanup": "Limpar",
+        "cleanup_nothing": "Nenhuma configuração órfã encontrada",
+        "cleanup_success": "{keys} configurações órfãs removidas",
+        "cleanup_error": "Erro ao limpar as configurações: {error}",
+        "test_layout_countdown": "As alterações serão revertidas automaticamente em {seconds} segundos."
     },
     "pt_PT": {
         "app_name": "Community Layout Switcher",
@@ -516,6 +566,8 @@ TRANSLATIONS = {
         "backup_restore_message": "Tem certeza de que deseja restaurar as suas configurações anteriores? Isto irá desfazer quaisquer alterações feitas desde a última cópia de segurança.",
         "backup_restore_success": "Configurações restauradas com sucesso",
         "backup_restore_error": "Erro ao restaurar cópia de segurança: {error}",
+        "backup_restore_summary": "{changed} configurações serão alteradas e {reset} removidas.",
+        "backup_restore_nothing": "As configurações já correspondem à cópia de segurança",
         "test_layout": "Testar Esquema",
         "test_layout_title": "Testar Esquema",
         "test_layout_message": "Deseja testar este esquema antes de o aplicar permanentemente? Pode reverter as alterações se necessário.",
@@ -528,7 +580,15 @@ TRANSLATIONS = {
         "close": "Fechar",
         "skip": "Ignorar",
         "backup": "Cópia de segurança",
-        "unknown": "Erro desconhecido"
+        "unknown": "Erro desconhecido",
+        "cleanup_settings": "Limpar definições",
+        "cleanup_title": "Limpar Definições",
+        "cleanup_message": "Versões anteriores deixaram {keys} definições órfãs ({size} KB) em {folders} pastas incorretas. Pretende removê-las?",
+        "cleanup": "Limpar",
+        "cleanup_nothing": "Nenhuma definição órfã encontrada",
+        "cleanup_success": "{keys} definições órfãs removidas",
+        "cleanup_error": "Erro ao limpar as definições: {error}",
+        "test_layout_countdown": "As alterações serão revertidas automaticamente dentro de {seconds} segundos."
     }
 }
 
@@ -2,36 +2,41 @@
 UI component classes for the Community Layout Switcher application.
 """
 
-import os
-import subprocess
 import gi
 gi.require_version('Gtk', '4.0')
-gi.require_version('Adw', '1')
 gi.require_version('Pango', '1.0')
-from gi.repository import Gtk, Adw, Pango, GLib
-from typing import Dict, List, Tuple, Optional
+from gi.repository import Gtk, Pango, GObject
+from typing import Dict
 
-from constants import LAYOUTS, EXTENSIONS
-from managers import ThemeManager, ExtensionManager, SystemUtils
+from constants import ROW_THUMBNAIL_SIZE
+from managers import ThemeManager, ExtensionManager, AssetResolver
+from thumbnails import TextureCache
 
 
-class LayoutRow(Gtk.ListBoxRow):
-    """Custom layout row widget"""
+class LayoutItem(GObject.Object):
+    """List model item for one layout of the catalog"""
     
-    def __init__(self, name: str, icon_file: str, fallback_icon: str, config_file: str, translator):
+    def __init__(self, name: str, config_file: str, icon_file: str, fallback_icon: str):
         super().__init__()
-        self.add_css_class("layout-row")
-        
-        # Store the layout data
         self.layout_name = name
         self.config_file = config_file
+        self.icon_file = icon_file
+        self.fallback_icon = fallback_icon
+
+
+class LayoutRow(Gtk.Box):
+    """Custom layout row widget, reused by the layout list view for different items"""
+    
+    def __init__(self):
+        super().__init__(orientation=Gtk.Orientation.HORIZONTAL, spacing=12)
+        self.add_css_class("layout-row")
+        self.item = None
         
         # Create row content
-        row_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=12)
-        row_box.set_margin_start(12)
-        row_box.set_margin_end(12)
-        row_box.set_margin_top(10)
-        row_box.set_margin_bottom(10)
+        self.set_margin_start(12)
+        self.set_margin_end(12)
+        self.set_margin_top(10)
+        self.set_margin_bottom(10)
         
         # Create icon container
         icon_container = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=4)
@@ -46,43 +51,50 @@ class LayoutRow(Gtk.ListBoxRow):
         icon_frame.set_valign(Gtk.Align.CENTER)
         
         # Create image
-        image = Gtk.Picture()
-        image.set_size_request(40, 40)
-        image.set_content_fit(Gtk.ContentFit.CONTAIN)
-        image.set_halign(Gtk.Align.CENTER)
-        image.set_valign(Gtk.Align.CENTER)
-        
-        # Try to load custom icon
-        if icon_file:
-            icon_path = SystemUtils.find_file(icon_file, ['icons'])
-            if icon_path:
-                image.set_filename(icon_path)
-            else:
-                # Use fallback icon
-                fallback_image = Gtk.Image.new_from_icon_name(fallback_icon)
-                fallback_image.set_pixel_size(32)
-                image.set_paintable(fallback_image.get_paintable())
-        else:
-            # Use fallback icon
-            fallback_image = Gtk.Image.new_from_icon_name(fallback_icon)
-            fallback_image.set_pixel_size(32)
-            image.set_paintable(fallback_image.get_paintable())
+        self.image = Gtk.Picture()
+        self.image.set_size_request(40, 40)
+        self.image.set_content_fit(Gtk.ContentFit.CONTAIN)
+        self.image.set_halign(Gtk.Align.CENTER)
+        self.image.set_valign(Gtk.Align.CENTER)
         
-        icon_frame.append(image)
+        icon_frame.append(self.image)
         icon_container.append(icon_frame)
         
         # Create label
-        label = Gtk.Label(label=name)
-        label.add_css_class("layout-label")
-        label.set_halign(Gtk.Align.START)
-        label.set_valign(Gtk.Align.CENTER)
-        label.set_ellipsize(Pango.EllipsizeMode.END)
-        label.set_max_width_chars(12)
+        self.label = Gtk.Label()
+        self.label.add_css_class("layout-label")
+        self.label.set_halign(Gtk.Align.START)
+        self.label.set_valign(Gtk.Align.CENTER)
+        self.label.set_ellipsize(Pango.EllipsizeMode.END)
+        self.label.set_max_width_chars(12)
         
         # Add to row box
-        row_box.append(icon_container)
-        row_box.append(label)
-        self.set_child(row_box)
+        self.append(icon_container)
+        self.append(self.label)
+    
+    def bind(self, item: LayoutItem):
+        """Show a layout in this row"""
+        self.item = item
+        self.label.set_text(item.layout_name)
+        
+        # Show the fallback icon until the texture of the custom icon is ready
+        fallback_image = Gtk.Image.new_from_icon_name(item.fallback_icon)
+        fallback_image.set_pixel_size(32)
+        self.image.set_paintable(fallback_image.get_paintable())
+        
+        width, height = ROW_THUMBNAIL_SIZE
+        icon_path = AssetResolver.resolve(item.icon_file, max(width, height))
+        if icon_path:
+            TextureCache.request(icon_path, width, height, lambda texture: self._on_texture(item, texture))
+    
+    def unbind(self):
+        """Forget the layout shown, so that late textures are ignored"""
+        self.item = None
+    
+    def _on_texture(self, item: LayoutItem, texture):
+        """Replace the fallback icon with the decoded thumbnail if the row still shows the item"""
+        if texture and self.item is item:
+            self.image.set_paintable(texture)
 
 
 class ThemeCard(Gtk.Box):